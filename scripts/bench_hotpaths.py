@@ -0,0 +1,301 @@
+#!/usr/bin/env python3
+"""
+Microbenchmarks of the functions run on every proxy request (url keys, token validation, fingerprints,
+state codec, PKCE parameters).
+
+Each benchmark is calibrated (pyperf style) so that one sample runs for at least `--min-time` seconds,
+then `--samples` samples are timed after `--warmups` discarded ones. Memory is measured separately, with
+tracemalloc enabled only for that phase so that it does not skew the timings:
+  - alloc_blocks, alloc_bytes: memory blocks (and their size) allocated per call and alive when it returns,
+    its result included, from a snapshot diff over `--alloc-calls` calls whose results are kept;
+  - alloc_peak_bytes: peak of the memory allocated during a single call, temporaries included;
+  - retained_blocks: memory blocks still alive after `--alloc-calls` calls once their results are dropped,
+    per call (should be 0).
+
+Results are written as JSON, compare two runs with scripts/compare_benchmarks.py.
+
+Usage: python scripts/bench_hotpaths.py [-o results.json] [--filter url.] [--samples 20] [--min-time 0.1]
+"""
+import argparse
+from datetime import datetime as dt, timedelta
+import datetime
+import gc
+import json
+import platform
+import statistics
+import subprocess
+import sys
+import time
+import tracemalloc
+from typing import Any, Callable, Dict, List, Tuple
+
+_BENCHMARKS: List[Tuple[str, Callable[[], Callable[[], Any]]]] = []
+
+
+def benchmark(name: str):
+    """
+    Registers a benchmark: the decorated function does the setup and returns the callable to measure.
+    """
+    def register(setup: Callable[[], Callable[[], Any]]) -> Callable[[], Callable[[], Any]]:
+        _BENCHMARKS.append((name, setup))
+        return setup
+    return register
+
+
+_AUTHORIZE_URL = (
+    "https://login.example.com/oauth2/authorize?client_id=cli&scope=openid+profile+offline_access"
+    "&redirect_uri=http%3A%2F%2Flocalhost%3A8080%2Fcallback&response_type=code"
+    "&code_challenge_method=S256&state=abc&nonce=n-0S6_WzA2Mj"
+)
+_CALLBACK_URL = "http://localhost:8080/callback"
+_SECRET = "0123456789abcdef0123456789abcdef"
+# equality mode of the authorize keys, see Oauth2AuthorizationFlowFactory.create_authorize_url
+_AUTHORIZE_KEY_MODE_PARAMS = ["client_id", "scope", "redirect_uri", "response_type"]
+
+
+def _authorize_url():
+    from pydantic import HttpUrl
+    from edenredtools.oauth2.flows.factory import Oauth2AuthorizationFlowFactory
+
+    return Oauth2AuthorizationFlowFactory.create_authorize_url(HttpUrl(_AUTHORIZE_URL))
+
+
+@benchmark("url.from_string")
+def bench_url_from_string():
+    from edenredtools.net.url import Url
+
+    return lambda: Url.from_string(_AUTHORIZE_URL)
+
+
+@benchmark("url.hash")
+def bench_url_hash():
+    from edenredtools.net.url import UrlEqualityMode
+
+    authorize_url = _authorize_url()
+    mode = UrlEqualityMode(query_params=_AUTHORIZE_KEY_MODE_PARAMS)
+    # fresh copies, as every request builds its own key
+    return lambda: hash(authorize_url.with_mode(mode))
+
+
+@benchmark("url.eq")
+def bench_url_eq():
+    from edenredtools.net.url import UrlEqualityMode
+
+    authorize_url = _authorize_url()
+    other = authorize_url.with_mode(UrlEqualityMode(query_params=_AUTHORIZE_KEY_MODE_PARAMS))
+    return lambda: authorize_url == other
+
+
+@benchmark("url.without_params")
+def bench_url_without_params():
+    from edenredtools.net.url import Url
+
+    url = Url.from_string(_AUTHORIZE_URL)
+    return lambda: url.without_params("state", "nonce")
+
+
+@benchmark("url.with_params")
+def bench_url_with_params():
+    from edenredtools.net.url import Url
+
+    url = Url.from_string(_AUTHORIZE_URL)
+    return lambda: url.with_params(state=["xyz"])
+
+
+@benchmark("token_validator.is_valid")
+def bench_token_validator_is_valid():
+    from edenredtools.oauth2.tokens.validator import TokenValidator
+
+    token = {
+        "access_token": "at",
+        "expires_in": 3600,
+        "issued_at": dt.now(datetime.timezone.utc).isoformat(),
+    }
+    return lambda: TokenValidator.is_valid(token, 10)
+
+
+@benchmark("token_validator.is_valid_expires_at")
+def bench_token_validator_is_valid_expires_at():
+    from edenredtools.oauth2.tokens.validator import TokenValidator
+
+    token = {
+        "access_token": "at",
+        "expires_at": (dt.now(datetime.timezone.utc) + timedelta(hours=1)).isoformat(),
+    }
+    return lambda: TokenValidator.is_valid(token, 10)
+
+
+@benchmark("crypto.compute_fingerprint")
+def bench_crypto_compute_fingerprint():
+    from edenredtools.security.crypto import CryptoUtils
+
+    string = "|".join((_AUTHORIZE_URL, _CALLBACK_URL))
+    return lambda: CryptoUtils.compute_fingerprint(secret=_SECRET, string=string)
+
+
+@benchmark("factory.create_authorize_url")
+def bench_factory_create_authorize_url():
+    from pydantic import HttpUrl
+    from edenredtools.oauth2.flows.factory import Oauth2AuthorizationFlowFactory
+
+    url = HttpUrl(_AUTHORIZE_URL)
+    return lambda: Oauth2AuthorizationFlowFactory.create_authorize_url(url)
+
+
+@benchmark("factory.create_state")
+def bench_factory_create_state():
+    from edenredtools.net.url import Url
+    from edenredtools.oauth2.flows.factory import Oauth2AuthorizationFlowFactory
+
+    authorize_url = _authorize_url()
+    callback_url = Url.from_string(_CALLBACK_URL)
+    return lambda: Oauth2AuthorizationFlowFactory.create_state(authorize_url, callback_url, _SECRET)
+
+
+@benchmark("factory.create_params")
+def bench_factory_create_params():
+    from edenredtools.oauth2.flows.factory import Oauth2AuthorizationFlowFactory
+
+    # includes the PKCE code verifier and challenge generation
+    authorize_url = _authorize_url()
+    return lambda: Oauth2AuthorizationFlowFactory.create_params(authorize_url, state="state")
+
+
+def calibrate(func: Callable[[], Any], min_time: float) -> int:
+    """
+    Returns the number of loops making a sample last at least `min_time` seconds.
+    """
+    loops = 1
+    while True:
+        if time_loops(func, loops) >= min_time:
+            return loops
+        loops *= 2
+
+
+def time_loops(func: Callable[[], Any], loops: int) -> float:
+    iterations = range(loops)
+    started_at = time.perf_counter()
+    for _ in iterations:
+        func()
+    return time.perf_counter() - started_at
+
+
+def measure_allocations(func: Callable[[], Any], calls: int) -> Dict[str, float]:
+    func()  # lazy initializations are not per call allocations
+    gc.collect()
+    tracemalloc.start()
+    try:
+        baseline, _ = tracemalloc.get_traced_memory()
+        tracemalloc.reset_peak()
+        func()
+        _, peak = tracemalloc.get_traced_memory()
+
+        # results are kept alive until the second snapshot, so that the diff counts them
+        results: List[Any] = [None] * calls
+        before = tracemalloc.take_snapshot()
+        for i in range(calls):
+            results[i] = func()
+        allocated = tracemalloc.take_snapshot()
+        del results
+        gc.collect()
+        after = tracemalloc.take_snapshot()
+    finally:
+        tracemalloc.stop()
+
+    own_traces = (tracemalloc.Filter(False, tracemalloc.__file__),)
+    before = before.filter_traces(own_traces)
+    allocations = allocated.filter_traces(own_traces).compare_to(before, "traceback")
+    retained = after.filter_traces(own_traces).compare_to(before, "traceback")
+    return {
+        "alloc_blocks": sum(max(0, stat.count_diff) for stat in allocations) / calls,
+        "alloc_bytes": sum(max(0, stat.size_diff) for stat in allocations) / calls,
+        "alloc_peak_bytes": peak - baseline,
+        "retained_blocks": sum(max(0, stat.count_diff) for stat in retained) / calls,
+    }
+
+
+def run_benchmark(
+    setup: Callable[[], Callable[[], Any]],
+    samples: int,
+    warmups: int,
+    min_time: float,
+    alloc_calls: int
+) -> Dict[str, Any]:
+    func = setup()
+    loops = calibrate(func, min_time)
+    for _ in range(warmups):
+        time_loops(func, loops)
+
+    gc_was_enabled = gc.isenabled()
+    gc.disable()
+    try:
+        timings = [time_loops(func, loops) / loops for _ in range(samples)]
+    finally:
+        if gc_was_enabled:
+            gc.enable()
+
+    return {
+        "loops": loops,
+        "samples": timings,
+        "mean": statistics.fmean(timings),
+        "median": statistics.median(timings),
+        "stdev": statistics.stdev(timings) if len(timings) > 1 else 0.0,
+        "min": min(timings),
+        **measure_allocations(func, alloc_calls),
+    }
+
+
+def metadata() -> Dict[str, Any]:
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        "date": dt.now(datetime.timezone.utc).isoformat(),
+        "python": sys.version.split()[0],
+        "implementation": platform.python_implementation(),
+        "platform": platform.platform(),
+        "commit": commit,
+    }
+
+
+def format_time(seconds: float) -> str:
+    for unit, scale in (("s", 1.0), ("ms", 1e-3), ("us", 1e-6)):
+        if seconds >= scale:
+            return f"{seconds / scale:.2f} {unit}"
+    return f"{seconds / 1e-9:.0f} ns"
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Run the edenredtools hot path microbenchmarks.")
+    parser.add_argument("-o", "--output", default=None, help="JSON file the results are written to.")
+    parser.add_argument("--filter", default="", help="Only run the benchmarks whose name starts with this prefix.")
+    parser.add_argument("--samples", type=int, default=20, help="Number of timed samples.")
+    parser.add_argument("--warmups", type=int, default=2, help="Number of discarded samples.")
+    parser.add_argument("--min-time", type=float, default=0.1, help="Minimum duration (s) of a sample.")
+    parser.add_argument("--alloc-calls", type=int, default=1000, help="Calls used to measure retained memory.")
+    args = parser.parse_args()
+
+    results: Dict[str, Any] = {"metadata": metadata(), "benchmarks": {}}
+    for name, setup in _BENCHMARKS:
+        if not name.startswith(args.filter):
+            continue
+        result = run_benchmark(setup, args.samples, args.warmups, args.min_time, args.alloc_calls)
+        results["benchmarks"][name] = result
+        print(
+            f"{name:40} {format_time(result['median']):>10} +- {format_time(result['stdev']):>10}"
+            f"   allocs {result['alloc_blocks']:>6.2f} blocks/call ({result['alloc_bytes']:.0f} B)"
+            f"   peak {result['alloc_peak_bytes']:>6} B   retained {result['retained_blocks']:.2f} blocks/call"
+        )
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+        print(f"Results written to {args.output}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
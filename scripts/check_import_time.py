@@ -0,0 +1,80 @@
+#!/usr/bin/env python3
+"""
+Import-time regression check for the edenredtools CLI entrypoint.
+
+Runs `python -X importtime` on the CLI module in a fresh interpreter and fails when:
+  - the cumulative import time exceeds the budget (best of N runs, to smooth out noise);
+  - any heavy dependency, which must only be loaded once a subcommand runs, gets imported.
+
+Usage: python scripts/check_import_time.py [--budget-ms 250] [--runs 5]
+"""
+import argparse
+import re
+import subprocess
+import sys
+from typing import Dict, List, Tuple
+
+ENTRYPOINT_MODULE = "edenredtools.cli.edenred_tools"
+FORBIDDEN_MODULES = ["flask", "werkzeug", "pydantic", "requests", "edenredtools.oauth2", "edenredtools.system"]
+
+_IMPORTTIME_RE = re.compile(r"^import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s*)(\S+)\s*$")
+
+
+def measure(module: str) -> Tuple[int, Dict[str, int]]:
+    """
+    Returns the cumulative import time (us) of `module` and the cumulative time of every module it loaded.
+    """
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        capture_output=True,
+        text=True,
+        check=True
+    )
+    imported: Dict[str, int] = {}
+    for line in result.stderr.splitlines():
+        match = _IMPORTTIME_RE.match(line)
+        if match:
+            _, cumulative, _, name = match.groups()
+            imported[name] = int(cumulative)
+    if module not in imported:
+        raise RuntimeError(f"module '{module}' not found in -X importtime output:\n{result.stderr}")
+    return imported[module], imported
+
+
+def find_forbidden(imported: Dict[str, int]) -> List[str]:
+    return [
+        forbidden for forbidden in FORBIDDEN_MODULES
+        if any(name == forbidden or name.startswith(forbidden + ".") for name in imported)
+    ]
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Check the import time of the edenredtools CLI.")
+    parser.add_argument("--budget-ms", type=float, default=250.0, help="Maximum cumulative import time.")
+    parser.add_argument("--runs", type=int, default=5, help="Number of measurements, the best one is kept.")
+    parser.add_argument("--module", default=ENTRYPOINT_MODULE, help="Module to import.")
+    args = parser.parse_args()
+
+    best_us, imported = min((measure(args.module) for _ in range(args.runs)), key=lambda m: m[0])
+    best_ms = best_us / 1000
+
+    failed = False
+    forbidden = find_forbidden(imported)
+    if forbidden:
+        failed = True
+        print(f"[FAIL] heavy modules imported at CLI startup: {', '.join(forbidden)}")
+
+    if best_ms > args.budget_ms:
+        failed = True
+        print(f"[FAIL] import of {args.module} took {best_ms:.1f} ms (budget {args.budget_ms:.1f} ms)")
+        slowest = sorted(imported.items(), key=lambda item: item[1], reverse=True)[:10]
+        for name, cumulative in slowest:
+            print(f"    {cumulative / 1000:8.1f} ms  {name}")
+    else:
+        print(f"[OK] import of {args.module} took {best_ms:.1f} ms (budget {args.budget_ms:.1f} ms)")
+
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,56 @@
+#!/usr/bin/env python3
+"""
+Compares two result files of scripts/bench_hotpaths.py and fails when a benchmark got slower than
+`--threshold` percent (median per call), or started retaining memory.
+
+Usage: python scripts/compare_benchmarks.py baseline.json candidate.json [--threshold 10]
+"""
+import argparse
+import json
+import sys
+from typing import Any, Dict
+
+
+def load(path: str) -> Dict[str, Any]:
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Compare two edenredtools benchmark runs.")
+    parser.add_argument("baseline", help="Results of the reference run.")
+    parser.add_argument("candidate", help="Results of the run to check.")
+    parser.add_argument("--threshold", type=float, default=10.0, help="Tolerated slowdown, in percent.")
+    args = parser.parse_args()
+
+    baseline = load(args.baseline)["benchmarks"]
+    candidate = load(args.candidate)["benchmarks"]
+
+    failed = False
+    print(f"{'benchmark':40} {'baseline':>12} {'candidate':>12} {'change':>9}   allocs/call   peak bytes")
+    for name in sorted(baseline.keys() | candidate.keys()):
+        if name not in baseline or name not in candidate:
+            print(f"{name:40} {'only in ' + ('baseline' if name in baseline else 'candidate'):>36}")
+            continue
+        before, after = baseline[name], candidate[name]
+        change = (after["median"] / before["median"] - 1) * 100
+        status = ""
+        if change > args.threshold:
+            status = "  [SLOWER]"
+            failed = True
+        elif change < -args.threshold:
+            status = "  [faster]"
+        if after["retained_blocks"] > 0.5 and before["retained_blocks"] <= 0.5:
+            status += "  [RETAINS MEMORY]"
+            failed = True
+        print(
+            f"{name:40} {before['median'] * 1e6:10.2f}us {after['median'] * 1e6:10.2f}us {change:+8.1f}%"
+            f"   {before.get('alloc_blocks', float('nan')):.2f} -> {after.get('alloc_blocks', float('nan')):.2f}"
+            f"   {before['alloc_peak_bytes']} -> {after['alloc_peak_bytes']}{status}"
+        )
+
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
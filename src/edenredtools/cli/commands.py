@@ -1,16 +1,17 @@
 from abc import ABC, abstractmethod
 import sys
+from typing import Dict, List, Optional
 
 import click
 
-from edenredtools.oauth2.flows.registry import ThreadSafeAuthorizationFlowRegistry
-from edenredtools.oauth2.proxies.local import FlaskOauth2LocalProxy
-from edenredtools.oauth2.proxies.models import Oauth2LocalProxyConfig
-from edenredtools.oauth2.tokens.registry import ThreadSafeOauth2TokenRegistry
-from edenredtools.system.registry import SystemRegistry
-
 
 class CliCommand(ABC):
+    """
+    Base class of CLI commands. Keep this module free of heavy top-level imports: it is
+    loaded by the CLI entrypoint, so every import here is paid by `edenredtools --help`.
+    Import heavy dependencies inside `execute` instead.
+    """
+
     def __call__(self) -> None:
         try:
             self.validate()
@@ -35,22 +36,189 @@ class Oauth2LocalProxyCommand(CliCommand):
         proxy_port: int,
         authorize_flow_timeout: int,
         autoconfigure_system: bool,
-        fingerprint_secret: str
+        fingerprint_secret: str,
+        callback_ports: List[int],
+        systemd_sockets: bool,
+        coalesce_browser_launches: bool,
+        browser_launch_interval: float,
+        warmup_manifest: Optional[str],
+        token_dir: Optional[str],
+        max_waiters_per_flow: int,
+        max_waiters_total: int,
+        shared_token_table: Optional[str],
+        shared_token_table_slots: int,
+        shared_token_table_slot_size: int,
+        idp_connect_timeout: float,
+        idp_read_timeout: float,
+        idp_max_retries: int,
+        idp_breaker_threshold: int,
+        idp_breaker_reset_timeout: float,
+        scope_superset_clients: List[str],
+        exchange_workers: int,
+        max_token_subscribers: int,
+        subscriber_buffer_size: int,
+        debug_endpoints: bool,
+        flow_failure_backoff: float,
+        flow_failure_backoff_max: float,
+        forward_routes: Optional[str],
+        forward_read_timeout: float,
+        capture_file: Optional[str],
+        log_level: str,
+        log_sample_rates: List[str]
     ) -> None:
         self.proxy_port = proxy_port
         self.authorize_flow_timeout = authorize_flow_timeout
         self.autoconfigure_system = autoconfigure_system
         self.fingerprint_secret = fingerprint_secret
+        self.callback_ports = callback_ports
+        self.systemd_sockets = systemd_sockets
+        self.coalesce_browser_launches = coalesce_browser_launches
+        self.browser_launch_interval = browser_launch_interval
+        self.warmup_manifest = warmup_manifest
+        self.token_dir = token_dir
+        self.max_waiters_per_flow = max_waiters_per_flow
+        self.max_waiters_total = max_waiters_total
+        self.shared_token_table = shared_token_table
+        self.shared_token_table_slots = shared_token_table_slots
+        self.shared_token_table_slot_size = shared_token_table_slot_size
+        self.idp_connect_timeout = idp_connect_timeout
+        self.idp_read_timeout = idp_read_timeout
+        self.idp_max_retries = idp_max_retries
+        self.idp_breaker_threshold = idp_breaker_threshold
+        self.idp_breaker_reset_timeout = idp_breaker_reset_timeout
+        self.scope_superset_clients = scope_superset_clients
+        self.exchange_workers = exchange_workers
+        self.max_token_subscribers = max_token_subscribers
+        self.subscriber_buffer_size = subscriber_buffer_size
+        self.debug_endpoints = debug_endpoints
+        self.flow_failure_backoff = flow_failure_backoff
+        self.flow_failure_backoff_max = flow_failure_backoff_max
+        self.forward_routes = forward_routes
+        self.forward_read_timeout = forward_read_timeout
+        self.capture_file = capture_file
+        self.log_level = log_level
+        self.log_sample_rates = log_sample_rates
+
+    @staticmethod
+    def parse_sample_rates(sample_rates: List[str]) -> Dict[str, float]:
+        parsed = {}
+        for sample_rate in sample_rates:
+            event, sep, rate = sample_rate.partition("=")
+            try:
+                parsed_rate = float(rate)
+            except ValueError:
+                parsed_rate = -1.0
+            if not sep or not event or not 0.0 <= parsed_rate <= 1.0:
+                raise ValueError(f"Invalid log sample rate '{sample_rate}', expected EVENT=RATE with 0 <= RATE <= 1.")
+            parsed[event] = parsed_rate
+        return parsed
 
     def execute(self) -> None:
-        FlaskOauth2LocalProxy(
-            SystemRegistry(),
-            ThreadSafeOauth2TokenRegistry(),
-            ThreadSafeAuthorizationFlowRegistry(),
-            Oauth2LocalProxyConfig(
-                port=self.proxy_port,
-                authorize_flow_timeout=self.authorize_flow_timeout,
-                autoconfigure_system=self.autoconfigure_system,
-                fingerprint_secret=self.fingerprint_secret
+        # heavy dependencies (flask, pydantic, requests) are only imported once the command runs
+        import logging
+        from edenredtools.net.resilience import HttpResilienceConfig
+        from edenredtools.oauth2.flows.registry import ThreadSafeAuthorizationFlowRegistry
+        from edenredtools.oauth2.identity_provider import ThreadSafeIdentityProviderRegistry
+        from edenredtools.oauth2.proxies.local import FlaskOauth2LocalProxy
+        from edenredtools.oauth2.proxies.models import Oauth2LocalProxyConfig
+        from edenredtools.oauth2.tokens.registry import ThreadSafeOauth2TokenRegistry
+        from edenredtools.oauth2.tokens.shared import SharedTokenTable
+        from edenredtools.oauth2.tokens.sinks import TokenFileSink
+        from edenredtools.system.logs import configure_logging
+        from edenredtools.system.registry import SystemRegistry
+
+        log_listener = configure_logging(
+            level=logging.getLevelName(self.log_level.upper()),
+            sample_rates=self.parse_sample_rates(self.log_sample_rates)
+        )
+
+        token_registry = ThreadSafeOauth2TokenRegistry(scope_superset_clients=self.scope_superset_clients)
+        if self.token_dir:
+            token_registry.add_listener(TokenFileSink(self.token_dir))
+        if self.shared_token_table:
+            token_registry.add_listener(
+                SharedTokenTable(self.shared_token_table, self.shared_token_table_slots, self.shared_token_table_slot_size)
             )
-        ).start()
\ No newline at end of file
+
+        try:
+            FlaskOauth2LocalProxy(
+                SystemRegistry(),
+                token_registry,
+                ThreadSafeAuthorizationFlowRegistry(
+                    failure_backoff=self.flow_failure_backoff,
+                    failure_backoff_max=self.flow_failure_backoff_max
+                ),
+                ThreadSafeIdentityProviderRegistry(
+                    HttpResilienceConfig(
+                        connect_timeout=self.idp_connect_timeout,
+                        read_timeout=self.idp_read_timeout,
+                        max_retries=self.idp_max_retries,
+                        breaker_failure_threshold=self.idp_breaker_threshold,
+                        breaker_reset_timeout=self.idp_breaker_reset_timeout
+                    )
+                ),
+                Oauth2LocalProxyConfig(
+                    port=self.proxy_port,
+                    authorize_flow_timeout=self.authorize_flow_timeout,
+                    autoconfigure_system=self.autoconfigure_system,
+                    fingerprint_secret=self.fingerprint_secret,
+                    callback_ports=self.callback_ports,
+                    systemd_sockets=self.systemd_sockets,
+                    coalesce_browser_launches=self.coalesce_browser_launches,
+                    browser_launch_interval=self.browser_launch_interval,
+                    warmup_manifest=self.warmup_manifest,
+                    max_waiters_per_flow=self.max_waiters_per_flow,
+                    max_waiters_total=self.max_waiters_total,
+                    exchange_workers=self.exchange_workers,
+                    max_token_subscribers=self.max_token_subscribers,
+                    subscriber_buffer_size=self.subscriber_buffer_size,
+                    debug_endpoints=self.debug_endpoints,
+                    forward_routes=self.forward_routes,
+                    forward_read_timeout=self.forward_read_timeout,
+                    capture_file=self.capture_file
+                )
+            ).start()
+        finally:
+            # flushes the records still queued
+            log_listener.stop()
+
+
+class Oauth2ReplayCommand(CliCommand):
+    def __init__(
+        self,
+        trace: str,
+        speed: float,
+        concurrency: int,
+        token_ttl: int,
+        consent_delay: float,
+        output: Optional[str]
+    ) -> None:
+        self.trace = trace
+        self.speed = speed
+        self.concurrency = concurrency
+        self.token_ttl = token_ttl
+        self.consent_delay = consent_delay
+        self.output = output
+
+    def execute(self) -> None:
+        import json
+        import logging
+        from edenredtools.oauth2.proxies.replay import TrafficReplay, load_trace
+        from edenredtools.system.logs import configure_logging
+
+        log_listener = configure_logging(level=logging.WARNING)
+        try:
+            report = TrafficReplay(
+                load_trace(self.trace),
+                speed=self.speed,
+                concurrency=self.concurrency,
+                token_ttl=self.token_ttl,
+                consent_delay=self.consent_delay
+            ).run()
+        finally:
+            log_listener.stop()
+
+        click.echo(json.dumps(report, indent=2))
+        if self.output:
+            with open(self.output, "w", encoding="utf-8") as f:
+                json.dump(report, f, indent=2)
@@ -1,6 +1,8 @@
+from typing import Optional, Tuple
+
 import cloup
 
-from edenredtools.cli.commands import Oauth2LocalProxyCommand
+from edenredtools.cli.commands import Oauth2LocalProxyCommand, Oauth2ReplayCommand
 from edenredtools.security.crypto import CryptoUtils
 
 ENVVAR_PREFIX = "EDENRED_TOOLS"
@@ -73,12 +75,242 @@ def edenred_tools_oauth2(ctx: cloup.Context) -> None:
     show_envvar=True,
     help="Secret used to produce state fingerprint for oauth2 authorization flow."
 )
+@cloup.option(
+    "-cbport", "--callback-port", "callback_ports",
+    type=int,
+    multiple=True,
+    help="Additional local port on which the proxy binds a callback listener (e.g. 80). Can be repeated."
+)
+@cloup.option(
+    "-systemd", "--systemd-sockets", "systemd_sockets",
+    type=bool,
+    default=False,
+    show_default=True,
+    help="If true, also serves callbacks on the listening sockets passed by systemd socket activation."
+)
+@cloup.option(
+    "-coalesce", "--coalesce-browser-launches", "coalesce_browser_launches",
+    type=bool,
+    default=False,
+    show_default=True,
+    help="If true, concurrent flows open a single local page listing all pending authorizations."
+)
+@cloup.option(
+    "-launch-interval", "--browser-launch-interval", "browser_launch_interval",
+    type=float,
+    default=10.0,
+    show_default=True,
+    help="Minimum time (in seconds) between two coalesced browser launches."
+)
+@cloup.option(
+    "-warmup", "--warmup-manifest", "warmup_manifest",
+    type=cloup.Path(exists=True, dir_okay=False),
+    default=None,
+    help="JSON manifest of the token requests (`flows`) to warm up at startup, optionally running "
+         "their authorization flows (`run_flows`) with bounded `concurrency`."
+)
+@cloup.option(
+    "-token-dir", "--token-dir", "token_dir",
+    type=cloup.Path(file_okay=False),
+    default=None,
+    help="If set, every token is also written (0600, atomically) to a file in this directory, "
+         "ideally on a tmpfs such as /dev/shm. `index.json` maps authorize keys to file names."
+)
+@cloup.option(
+    "-max-flow-waiters", "--max-waiters-per-flow", "max_waiters_per_flow",
+    type=cloup.IntRange(min=0),
+    default=32,
+    show_default=True,
+    help="Maximum number of token requests waiting for the same authorization flow (0 = unlimited). "
+         "Requests over the limit get a 429 with Retry-After."
+)
+@cloup.option(
+    "-max-waiters", "--max-waiters-total", "max_waiters_total",
+    type=cloup.IntRange(min=0),
+    default=256,
+    show_default=True,
+    help="Maximum number of token requests waiting for any authorization flow (0 = unlimited). "
+         "Requests over the limit get a 503 with Retry-After."
+)
+@cloup.option(
+    "-shm-table", "--shared-token-table", "shared_token_table",
+    type=cloup.Path(dir_okay=False),
+    default=None,
+    help="If set, tokens are mirrored into a memory-mapped table at this path (e.g. /dev/shm/edenredtools.tokens), "
+         "readable by other local processes with SharedTokenTableReader."
+)
+@cloup.option(
+    "-shm-slots", "--shared-token-table-slots", "shared_token_table_slots",
+    type=cloup.IntRange(min=1),
+    default=256,
+    show_default=True,
+    help="Number of token slots of the shared token table."
+)
+@cloup.option(
+    "-shm-slot-size", "--shared-token-table-slot-size", "shared_token_table_slot_size",
+    type=cloup.IntRange(min=1024),
+    default=8192,
+    show_default=True,
+    help="Size (in bytes) of a slot of the shared token table, i.e. the maximum size of a JSON encoded token."
+)
+@cloup.option(
+    "-idp-connect-timeout", "--idp-connect-timeout", "idp_connect_timeout",
+    type=float,
+    default=3.05,
+    show_default=True,
+    help="Connect timeout (in seconds) of the calls to the identity providers."
+)
+@cloup.option(
+    "-idp-read-timeout", "--idp-read-timeout", "idp_read_timeout",
+    type=float,
+    default=10.0,
+    show_default=True,
+    help="Read timeout (in seconds) of the calls to the identity providers."
+)
+@cloup.option(
+    "-idp-retries", "--idp-max-retries", "idp_max_retries",
+    type=cloup.IntRange(min=0),
+    default=3,
+    show_default=True,
+    help="Maximum number of retries, with jittered exponential backoff, of idempotent identity provider calls."
+)
+@cloup.option(
+    "-idp-breaker-threshold", "--idp-breaker-threshold", "idp_breaker_threshold",
+    type=cloup.IntRange(min=1),
+    default=5,
+    show_default=True,
+    help="Consecutive failures after which calls to an identity provider fail fast."
+)
+@cloup.option(
+    "-idp-breaker-reset", "--idp-breaker-reset-timeout", "idp_breaker_reset_timeout",
+    type=float,
+    default=30.0,
+    show_default=True,
+    help="Time (in seconds) an identity provider circuit stays open before a trial call is let through."
+)
+@cloup.option(
+    "-scope-superset", "--scope-superset-client", "scope_superset_clients",
+    type=str,
+    multiple=True,
+    help="Client id (or '*' for all clients) for which a valid token granted for a superset of the requested "
+         "scopes is reused instead of starting a new authorization flow. Can be repeated."
+)
+@cloup.option(
+    "-exchange-workers", "--exchange-workers", "exchange_workers",
+    type=cloup.IntRange(min=1),
+    default=4,
+    show_default=True,
+    help="Number of background workers exchanging authorization codes for tokens, "
+         "so that callback pages are returned without waiting for the identity provider."
+)
+@cloup.option(
+    "-max-subscribers", "--max-token-subscribers", "max_token_subscribers",
+    type=cloup.IntRange(min=1),
+    default=64,
+    show_default=True,
+    help="Maximum number of concurrent /proxy/subscribe streams, each of them holds a server thread."
+)
+@cloup.option(
+    "-subscriber-buffer", "--subscriber-buffer-size", "subscriber_buffer_size",
+    type=cloup.IntRange(min=1),
+    default=16,
+    show_default=True,
+    help="Maximum number of undelivered token notifications per subscriber, coalesced per authorize url. "
+         "On overflow the oldest are dropped and the subscriber receives a `resync` event."
+)
+@cloup.option(
+    "-debug-endpoints", "--debug-endpoints", "debug_endpoints",
+    type=bool,
+    default=False,
+    show_default=True,
+    help="Enable the loopback-only /proxy/debug/profile (sampled collapsed stacks of all threads) "
+         "and /proxy/debug/heap (tracemalloc snapshot diff) endpoints."
+)
+@cloup.option(
+    "-flow-backoff", "--flow-failure-backoff", "flow_failure_backoff",
+    type=cloup.FloatRange(min=0),
+    default=5.0,
+    show_default=True,
+    help="Time (in seconds) during which token requests for an authorize url whose flow just failed get the "
+         "error back (503) instead of starting a new flow. Doubled on consecutive failures, 0 disables it."
+)
+@cloup.option(
+    "-flow-backoff-max", "--flow-failure-backoff-max", "flow_failure_backoff_max",
+    type=cloup.FloatRange(min=0),
+    default=300.0,
+    show_default=True,
+    help="Maximum failure backoff (in seconds) of an authorize url. POST /proxy/flows/reset ends it earlier."
+)
+@cloup.option(
+    "-forward-routes", "--forward-routes", "forward_routes",
+    type=cloup.Path(exists=True, dir_okay=False),
+    default=None,
+    help="JSON file of `routes` ({name, upstream, authorize_url, callback_url, client_secret?}). Requests to "
+         "/proxy/forward/<name>/<path> are forwarded to <upstream>/<path> with the route's bearer token."
+)
+@cloup.option(
+    "-forward-read-timeout", "--forward-read-timeout", "forward_read_timeout",
+    type=float,
+    default=60.0,
+    show_default=True,
+    help="Read timeout (in seconds) of the forwarded requests."
+)
+@cloup.option(
+    "-capture-file", "--capture-file", "capture_file",
+    type=cloup.Path(dir_okay=False, writable=True),
+    default=None,
+    help="Record the token and callback requests served (timings and anonymized keys only, never tokens) "
+         "to this JSON lines file, for `oauth2 replay`."
+)
+@cloup.option(
+    "-log-level", "--log-level", "log_level",
+    type=cloup.Choice(["DEBUG", "INFO", "WARNING", "ERROR"], case_sensitive=False),
+    default="INFO",
+    show_default=True,
+    help="Level of the structured (JSON lines, on stderr) logs."
+)
+@cloup.option(
+    "-log-sample", "--log-sample-rate", "log_sample_rates",
+    type=str,
+    multiple=True,
+    default=("token.cache_hit=0.1",),
+    show_default=True,
+    help="EVENT=RATE, fraction (0 to 1) of the records of a high rate event that are logged. Can be repeated."
+)
 def edenred_tools_oauth2_local_proxy(
     ctx: cloup.Context,
     proxy_port: int,
     authorize_flow_timeout: int,
     autoconfigure_system: bool,
-    fingerprint_secret: str
+    fingerprint_secret: str,
+    callback_ports: Tuple[int, ...],
+    systemd_sockets: bool,
+    coalesce_browser_launches: bool,
+    browser_launch_interval: float,
+    warmup_manifest: Optional[str],
+    token_dir: Optional[str],
+    max_waiters_per_flow: int,
+    max_waiters_total: int,
+    shared_token_table: Optional[str],
+    shared_token_table_slots: int,
+    shared_token_table_slot_size: int,
+    idp_connect_timeout: float,
+    idp_read_timeout: float,
+    idp_max_retries: int,
+    idp_breaker_threshold: int,
+    idp_breaker_reset_timeout: float,
+    scope_superset_clients: Tuple[str, ...],
+    exchange_workers: int,
+    max_token_subscribers: int,
+    subscriber_buffer_size: int,
+    debug_endpoints: bool,
+    flow_failure_backoff: float,
+    flow_failure_backoff_max: float,
+    forward_routes: Optional[str],
+    forward_read_timeout: float,
+    capture_file: Optional[str],
+    log_level: str,
+    log_sample_rates: Tuple[str, ...]
 ) -> None:
     """
     Launch a local OAuth2 authorization proxy server that intercepts browser
@@ -88,7 +320,99 @@ def edenred_tools_oauth2_local_proxy(
         proxy_port=proxy_port,
         authorize_flow_timeout=authorize_flow_timeout,
         autoconfigure_system=autoconfigure_system,
-        fingerprint_secret=fingerprint_secret
+        fingerprint_secret=fingerprint_secret,
+        callback_ports=list(callback_ports),
+        systemd_sockets=systemd_sockets,
+        coalesce_browser_launches=coalesce_browser_launches,
+        browser_launch_interval=browser_launch_interval,
+        warmup_manifest=warmup_manifest,
+        token_dir=token_dir,
+        max_waiters_per_flow=max_waiters_per_flow,
+        max_waiters_total=max_waiters_total,
+        shared_token_table=shared_token_table,
+        shared_token_table_slots=shared_token_table_slots,
+        shared_token_table_slot_size=shared_token_table_slot_size,
+        idp_connect_timeout=idp_connect_timeout,
+        idp_read_timeout=idp_read_timeout,
+        idp_max_retries=idp_max_retries,
+        idp_breaker_threshold=idp_breaker_threshold,
+        idp_breaker_reset_timeout=idp_breaker_reset_timeout,
+        scope_superset_clients=list(scope_superset_clients),
+        exchange_workers=exchange_workers,
+        max_token_subscribers=max_token_subscribers,
+        subscriber_buffer_size=subscriber_buffer_size,
+        debug_endpoints=debug_endpoints,
+        flow_failure_backoff=flow_failure_backoff,
+        flow_failure_backoff_max=flow_failure_backoff_max,
+        forward_routes=forward_routes,
+        forward_read_timeout=forward_read_timeout,
+        capture_file=capture_file,
+        log_level=log_level,
+        log_sample_rates=list(log_sample_rates)
+    ).execute()
+
+
+
+@edenred_tools_oauth2.command(
+    "replay",
+    help="Replay a trace recorded with `local-proxy --capture-file` against an in-process proxy and a stub "
+         "identity provider, and report latency percentiles and the cache hit ratio."
+)
+@cloup.pass_context
+@cloup.argument("trace", type=cloup.Path(exists=True, dir_okay=False))
+@cloup.option(
+    "-speed", "--speed", "speed",
+    type=cloup.FloatRange(min=0.0),
+    default=1.0,
+    show_default=True,
+    help="Replay speed relative to the recorded pace, 0 sends the requests as fast as possible."
+)
+@cloup.option(
+    "-concurrency", "--concurrency", "concurrency",
+    type=cloup.IntRange(min=1),
+    default=32,
+    show_default=True,
+    help="Maximum number of requests in flight."
+)
+@cloup.option(
+    "-token-ttl", "--token-ttl", "token_ttl",
+    type=cloup.IntRange(min=1),
+    default=3600,
+    show_default=True,
+    help="Lifetime (in seconds) of the tokens granted by the stub identity provider."
+)
+@cloup.option(
+    "-consent-delay", "--consent-delay", "consent_delay",
+    type=cloup.FloatRange(min=0.0),
+    default=0.05,
+    show_default=True,
+    help="Consent delay (in seconds) of the flows the trace has no recorded callback for."
+)
+@cloup.option(
+    "-output", "--output", "output",
+    type=cloup.Path(dir_okay=False, writable=True),
+    default=None,
+    help="Also write the JSON report to this file."
+)
+def edenred_tools_oauth2_replay(
+    ctx: cloup.Context,
+    trace: str,
+    speed: float,
+    concurrency: int,
+    token_ttl: int,
+    consent_delay: float,
+    output: Optional[str]
+) -> None:
+    """
+    Replay a captured local proxy trace and report its latency distribution.
+    """
+    Oauth2ReplayCommand(
+        trace=trace,
+        speed=speed,
+        concurrency=concurrency,
+        token_ttl=token_ttl,
+        consent_delay=consent_delay,
+        output=output
     ).execute()
 
 
@@ -0,0 +1,164 @@
+from dataclasses import dataclass
+import random
+import threading
+import time
+from typing import Any, Optional
+
+import requests
+
+
+@dataclass(frozen=True)
+class HttpResilienceConfig:
+    connect_timeout: float = 3.05
+    read_timeout: float = 10.0
+    max_retries: int = 3
+    backoff_base: float = 0.2
+    backoff_max: float = 5.0
+    breaker_failure_threshold: int = 5
+    breaker_reset_timeout: float = 30.0
+
+
+class CircuitOpenError(ConnectionError):
+    pass
+
+
+class CircuitBreaker:
+    """
+    Classic three states circuit breaker: after `failure_threshold` consecutive failures the circuit opens
+    and calls fail fast for `reset_timeout` seconds, then a single trial call is let through (half open)
+    whose outcome closes or re-opens the circuit. A trial call that ends without an outcome (an unexpected
+    error) must be released, so that the next call becomes the trial.
+    """
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half-open"
+
+    def __init__(self, name: str, failure_threshold: int = 5, reset_timeout: float = 30.0) -> None:
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._lock = threading.Lock()
+        self._state = self.CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probing = False
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            return self._state
+
+    def before_call(self) -> None:
+        with self._lock:
+            if self._state == self.CLOSED:
+                return
+            if self._state == self.OPEN and time.monotonic() - self._opened_at >= self.reset_timeout:
+                self._state = self.HALF_OPEN
+            if self._state == self.HALF_OPEN:
+                if self._probing:
+                    raise CircuitOpenError(f"circuit '{self.name}' is half open, a trial call is in progress.")
+                self._probing = True
+                return
+            raise self._open_error()
+
+    def check(self) -> None:
+        """
+        Raises `CircuitOpenError` while calls fail fast, without taking the half open trial slot.
+        """
+        with self._lock:
+            if self._state == self.OPEN and time.monotonic() - self._opened_at < self.reset_timeout:
+                raise self._open_error()
+
+    def _open_error(self) -> CircuitOpenError:
+        # called under `_lock`
+        retry_in = max(0.0, self.reset_timeout - (time.monotonic() - self._opened_at))
+        return CircuitOpenError(f"circuit '{self.name}' is open, failing fast (retry in {retry_in:.0f}s).")
+
+    def record_success(self) -> None:
+        with self._lock:
+            self._state = self.CLOSED
+            self._failures = 0
+            self._probing = False
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self._failures += 1
+            if self._state == self.HALF_OPEN or self._failures >= self.failure_threshold:
+                self._state = self.OPEN
+                self._opened_at = time.monotonic()
+            self._probing = False
+
+    def release(self) -> None:
+        """
+        Ends a call that recorded neither a success nor a failure.
+        """
+        with self._lock:
+            self._probing = False
+
+
+class ResilientHttpClient:
+    """
+    Wraps a pooled `requests.Session` with connect/read timeouts, jittered exponential backoff retries
+    for idempotent calls and a circuit breaker. Connection errors, timeouts and 5xx responses count as
+    failures; non idempotent calls are only retried when the connection could not be established,
+    i.e. when the request was never sent.
+    """
+
+    def __init__(
+        self,
+        session: Optional[requests.Session] = None,
+        config: HttpResilienceConfig = HttpResilienceConfig(),
+        breaker: Optional[CircuitBreaker] = None
+    ) -> None:
+        self.session = session or requests.Session()
+        self.config = config
+        self.breaker = breaker or CircuitBreaker(
+            "http",
+            failure_threshold=config.breaker_failure_threshold,
+            reset_timeout=config.breaker_reset_timeout
+        )
+
+    def get(self, url: str, **kwargs: Any) -> requests.Response:
+        return self.request("GET", url, idempotent=True, **kwargs)
+
+    def post(self, url: str, **kwargs: Any) -> requests.Response:
+        return self.request("POST", url, idempotent=False, **kwargs)
+
+    def request(self, method: str, url: str, idempotent: bool, **kwargs: Any) -> requests.Response:
+        kwargs.setdefault("timeout", (self.config.connect_timeout, self.config.read_timeout))
+        attempt = 0
+        while True:
+            self.breaker.before_call()
+            try:
+                response = self.session.request(method, url, **kwargs)
+            except requests.exceptions.ConnectTimeout:
+                self.breaker.record_failure()
+                if not self._should_retry(attempt, retryable=True):
+                    raise
+            except (requests.exceptions.ConnectionError, requests.exceptions.Timeout):
+                self.breaker.record_failure()
+                if not self._should_retry(attempt, retryable=idempotent):
+                    raise
+            except requests.exceptions.RequestException:
+                self.breaker.record_failure()
+                raise
+            except BaseException:
+                # not an outcome of the remote call, frees the half open trial slot
+                self.breaker.release()
+                raise
+            else:
+                if response.status_code < 500:
+                    self.breaker.record_success()
+                    return response
+                self.breaker.record_failure()
+                if not self._should_retry(attempt, retryable=idempotent):
+                    return response
+            self._backoff(attempt)
+            attempt += 1
+
+    def _should_retry(self, attempt: int, retryable: bool) -> bool:
+        return retryable and attempt < self.config.max_retries
+
+    def _backoff(self, attempt: int) -> None:
+        # "full jitter" exponential backoff
+        time.sleep(random.uniform(0, min(self.config.backoff_max, self.config.backoff_base * 2 ** attempt)))
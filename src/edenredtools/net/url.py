@@ -74,20 +74,37 @@ class Url:
 
     def to_string(self) -> str:
         return str(self)
+
+    def canonical_string(self) -> str:
+        """
+        Return a stable string made only of the components taken into account by the equality mode:
+        equal urls always share the same canonical string.
+        """
+        query = urllib.parse.urlencode(
+            [(name, value) for name, values in self._select_normalized_params() for value in values]
+        )
+        return urllib.parse.urlunparse((
+            self._parsed_url.scheme if self._mode.scheme else "",
+            self._parsed_url.netloc if self._mode.netloc else "",
+            self._parsed_url.path if self._mode.path else "",
+            "",
+            query,
+            self._parsed_url.fragment if self._mode.fragment else ""
+        ))
     
     def port(self) -> int:
-        split = self._parsed_url.netloc.split(":", maxsplit=1)
-        if len(split) == 1:
+        # urllib parses bracketed IPv6 hosts ([::1]:8080), which a split on ":" does not
+        port = self._parsed_url.port
+        if port is None:
             if self._parsed_url.scheme == "http": 
                 return 80
             elif self._parsed_url.scheme == "https": 
                 return 443
             return -1
-        return int(split[1])
+        return port
     
     def hostname(self) -> str:
-        split = self._parsed_url.netloc.split(":", maxsplit=1)
-        return split[0]
+        return self._parsed_url.hostname or ""
     
     def path(self) -> str:
         return self._parsed_url.path
@@ -126,3 +143,10 @@ class Url:
     @classmethod
     def from_string(cls, url: str, mode: UrlEqualityMode = UrlEqualityMode()) -> "Url":
         return cls(urllib.parse.urlparse(url), mode=mode)
+
+    @classmethod
+    def from_host(cls, scheme: str, host: str) -> "Url":
+        """
+        Origin of a request from its scheme and `Host` header (`host`, `host:port`, `[::1]:port`).
+        """
+        return cls.from_string(f"{scheme}://{host}")
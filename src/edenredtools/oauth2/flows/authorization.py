@@ -9,7 +9,6 @@ import string
 from typing import Any, Dict, List, Optional
 
 from pydantic import BaseModel, HttpUrl
-import requests
 
 from edenredtools.oauth2.identity_provider import Oauth2IdentityProvider
 from edenredtools.system.broswer import Browser
@@ -115,11 +114,13 @@ class Oauth2AuthorizationFlow:
         if not self.authorize_params.use_pkce() and not self.client_secret:
             raise ValueError("")
         
-    def commence(self) -> None:
+    def authorization_request_url(self) -> str:
         authorize_url = self.identity_provider.authorize_url()
         query_params = self.authorize_params.to_query_params()
-        url = str(authorize_url.with_params(**query_params))
-        self.browser.open(url)
+        return str(authorize_url.with_params(**query_params))
+
+    def commence(self) -> None:
+        self.browser.open(self.authorization_request_url())
         
     def exchange_code(self, code: str, state: str) -> Dict[str, Any]:
         data = {
@@ -134,7 +135,7 @@ class Oauth2AuthorizationFlow:
             data["code_verifier"] = self.authorize_params.code_verifier
 
         headers = {"Content-Type": "application/x-www-form-urlencoded"}
-        resp = requests.post(str(self.identity_provider.token_url()), data=data, headers=headers)
+        resp = self.identity_provider.http_client().post(str(self.identity_provider.token_url()), data=data, headers=headers)
         resp.raise_for_status()
         token_data = resp.json()
         if "expires_at" not in token_data:
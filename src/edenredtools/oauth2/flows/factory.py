@@ -1,4 +1,5 @@
 import base64
+from typing import FrozenSet, Optional
 from pydantic import HttpUrl
 from edenredtools.security.crypto import CryptoUtils
 from edenredtools.net.url import Url, UrlEqualityMode
@@ -9,6 +10,9 @@ class Oauth2AuthorizationFlowFactory:
     _AUTHORIZE_URL_EQ_MODE = UrlEqualityMode(
         query_params=["client_id", "scope", "redirect_uri", "response_type"]
     )
+    _SCOPE_GROUP_EQ_MODE = UrlEqualityMode(
+        query_params=["client_id", "redirect_uri", "response_type"]
+    )
     
     @classmethod
     def create_params(cls, authorize_url: Url, state: str) -> Oauth2AuthorizeRequestParams:
@@ -31,6 +35,17 @@ class Oauth2AuthorizationFlowFactory:
             mode=cls._AUTHORIZE_URL_EQ_MODE
         ).without_params(*Oauth2AuthorizeRequestParams.transients())
     
+    @classmethod
+    def create_scope_group_key(cls, authorize_url: Url) -> Url:
+        """
+        Returns the key shared by the authorize urls differing only by their scope.
+        """
+        return authorize_url.with_mode(cls._SCOPE_GROUP_EQ_MODE)
+
+    @classmethod
+    def parse_scopes(cls, scope: Optional[str]) -> FrozenSet[str]:
+        return frozenset((scope or "").split())
+
     @classmethod
     def compute_fingerprint(cls, authorize_url: Url, callback_url: Url, secret: str) -> str:
         return CryptoUtils.compute_fingerprint(
@@ -1,9 +1,37 @@
 from abc import ABC, abstractmethod
+from dataclasses import dataclass
+import logging
 import threading
-from typing import Dict, Optional
+import time
+from typing import Dict, List, Optional, Tuple
 
 from edenredtools.oauth2.flows.authorization import Oauth2AuthorizationFlow
 from edenredtools.net.url import Url
+from edenredtools.system.logs import log_event
+
+logger = logging.getLogger(__name__)
+
+
+class FlowFailedRecently(Exception):
+    """
+    Raised instead of starting a new flow while the last flow of the same authorize url is in its failure backoff window.
+    """
+
+    def __init__(self, error: Exception, failures: int, retry_after: float) -> None:
+        super().__init__(
+            f"Authorization flow failed {failures} time(s) recently ({error}), "
+            f"not retrying before {retry_after:.0f} seconds."
+        )
+        self.error = error
+        self.failures = failures
+        self.retry_after = retry_after
+
+
+@dataclass
+class FlowFailure:
+    error: Exception
+    failures: int
+    retry_at: float
 
 
 class FlowState:
@@ -13,6 +41,7 @@ class FlowState:
         self._error: Optional[Exception] = None
         self._initiator_thread_id = threading.get_ident()
         self._flow: Optional[Oauth2AuthorizationFlow] = None
+        self._callback_claimed = False
         
     def in_error(self) -> bool:
         return bool(self._error)
@@ -34,10 +63,23 @@ class FlowState:
             self._completed = True
             self._lock.notify_all()
 
+    def callback_received(self) -> bool:
+        return self._callback_claimed
+
+    def claim_callback(self) -> bool:
+        """
+        Returns True for the first callback of the flow only: a reloaded callback page must not
+        exchange the same authorization code twice.
+        """
+        with self._lock:
+            claimed = self._callback_claimed
+            self._callback_claimed = True
+            return not claimed
+
     def wait_for_flow(self, timeout: float = 60.0) -> None:
         with self._lock:
-            if not self._completed:
-                self._lock.wait(timeout=timeout)
+            if not self._lock.wait_for(lambda: self._completed, timeout=timeout):
+                raise TimeoutError(f"authorization flow did not complete within {timeout} seconds")
                 
     def set_flow(self, flow: Oauth2AuthorizationFlow) -> None:
         self._flow = flow
@@ -53,38 +95,98 @@ class AuthorizationFlowRegistry(ABC):
     @abstractmethod
     def get(self, authorize_url: Url) -> Optional[FlowState]: ...
 
+    @abstractmethod
+    def pending(self) -> List[Tuple[Url, FlowState]]: ...
+
     @abstractmethod
     def mark_done(self, authorize_url: Url) -> None: ...
 
     @abstractmethod
     def mark_error(self, authorize_url: Url, err: Exception) -> None: ...
 
+    @abstractmethod
+    def reset_failures(self, authorize_url: Optional[Url] = None) -> int: ...
+
 
 class ThreadSafeAuthorizationFlowRegistry(AuthorizationFlowRegistry):
-    def __init__(self) -> None:
+    def __init__(self, failure_backoff: float = 5.0, failure_backoff_max: float = 300.0) -> None:
+        """
+        :param failure_backoff: Time (in seconds) during which a failed flow is not started again, doubled on
+            every consecutive failure of the same authorize url up to `failure_backoff_max`. 0 disables it.
+        """
         self._lock = threading.Lock()
         self._flows: Dict[Url, FlowState] = {}
+        self.failure_backoff = failure_backoff
+        self.failure_backoff_max = failure_backoff_max
+        self._failures: Dict[Url, FlowFailure] = {}
 
     def get_or_create(self, authorize_url: Url) -> FlowState:
         with self._lock:
             state = self._flows.get(authorize_url)
             if not state:
+                self._check_failure_backoff(authorize_url)
                 state = FlowState()
                 self._flows[authorize_url] = state
+                log_event(logger, "flow.created", authorize_url=authorize_url)
             return state
         
     def get(self, authorize_url: Url) -> Optional[FlowState]:
         with self._lock:
             return self._flows.get(authorize_url)
 
+    def pending(self) -> List[Tuple[Url, FlowState]]:
+        with self._lock:
+            return list(self._flows.items())
+
     def mark_done(self, authorize_url: Url) -> None:
         with self._lock:
             state = self._flows.pop(authorize_url, None)
+            self._failures.pop(authorize_url, None)
         if state:
+            log_event(logger, "flow.completed", authorize_url=authorize_url)
             state.mark_done()
 
     def mark_error(self, authorize_url: Url, err: Exception) -> None:
+        failure = None
         with self._lock:
             state = self._flows.pop(authorize_url, None)
+            if state and self.failure_backoff:
+                failure = self._record_failure(authorize_url, err)
         if state:
+            log_event(
+                logger, "flow.failed", logging.WARNING,
+                authorize_url=authorize_url,
+                error=str(err),
+                failures=failure.failures if failure else None
+            )
             state.mark_error(err)
+
+    def reset_failures(self, authorize_url: Optional[Url] = None) -> int:
+        """
+        Ends the failure backoff of an authorize url, or of all of them. Returns the number of urls reset.
+        """
+        with self._lock:
+            if authorize_url is None:
+                count = len(self._failures)
+                self._failures.clear()
+                return count
+            return 1 if self._failures.pop(authorize_url, None) else 0
+
+    def _record_failure(self, authorize_url: Url, err: Exception) -> FlowFailure:
+        previous = self._failures.get(authorize_url)
+        failures = previous.failures + 1 if previous else 1
+        window = min(self.failure_backoff_max, self.failure_backoff * 2 ** (failures - 1))
+        failure = FlowFailure(error=err, failures=failures, retry_at=time.monotonic() + window)
+        self._failures[authorize_url] = failure
+        return failure
+
+    def _check_failure_backoff(self, authorize_url: Url) -> None:
+        failure = self._failures.get(authorize_url)
+        if not failure:
+            return
+        now = time.monotonic()
+        if now < failure.retry_at:
+            raise FlowFailedRecently(failure.error, failure.failures, failure.retry_at - now)
+        # failures older than the longest window are forgotten, the next one starts a new backoff
+        if now >= failure.retry_at + self.failure_backoff_max:
+            del self._failures[authorize_url]
@@ -1,8 +1,11 @@
 from abc import ABC, abstractmethod
-from typing import Optional
+import threading
+from typing import Dict, Optional
 
 import requests
+from edenredtools.net.resilience import CircuitBreaker, HttpResilienceConfig, ResilientHttpClient
 from edenredtools.net.url import Url
+from edenredtools.oauth2.tokens.jwt import JwksCache, JwtValidator
 
 
 class Oauth2IdentityProvider(ABC):
@@ -11,22 +14,45 @@ class Oauth2IdentityProvider(ABC):
     
     @abstractmethod
     def authorize_url(self) -> Url: ...
+
+    @abstractmethod
+    def userinfo_url(self) -> Optional[Url]: ...
+
+    @abstractmethod
+    def issuer(self) -> Optional[str]: ...
+
+    @abstractmethod
+    def jwks_url(self) -> Optional[Url]: ...
+
+    @abstractmethod
+    def jwt_validator(self) -> JwtValidator: ...
+
+    @abstractmethod
+    def http_client(self) -> ResilientHttpClient: ...
     
     
 class OidcIdentityProvider(Oauth2IdentityProvider):
-    def __init__(self, base_url: Url, session: Optional[requests.Session] = None) -> None:
+    def __init__(
+        self,
+        base_url: Url,
+        session: Optional[requests.Session] = None,
+        http_client: Optional[ResilientHttpClient] = None
+    ) -> None:
         """
         :param base_url: Base URL of the IdP (e.g., https://accounts.google.com)
         :param session: Optional session object for connection reuse or mocking in tests.
+        :param http_client: Optional client wrapping the session with timeouts, retries and circuit breaker.
         """
         self.base_url = base_url.normalize_path()
-        self._session = session or requests.Session()
+        self._http = http_client or ResilientHttpClient(session)
         self._discovery_doc = self._fetch_discovery_doc()
+        self._lock = threading.Lock()
+        self._jwt_validator: Optional[JwtValidator] = None
 
     def _fetch_discovery_doc(self) -> dict:
         """Retrieve the OpenID Connect discovery document."""
         discovery_url = self.base_url.join("/.well-known/openid-configuration")
-        response = self._session.get(str(discovery_url), timeout=5)
+        response = self._http.get(str(discovery_url))
         response.raise_for_status()
         return response.json()
 
@@ -37,3 +63,77 @@ class OidcIdentityProvider(Oauth2IdentityProvider):
     def authorize_url(self) -> Url:
         """Return the authorization endpoint from the discovery document."""
         return Url.from_string(self._discovery_doc.get("authorization_endpoint"))
+
+    def userinfo_url(self) -> Optional[Url]:
+        """Return the userinfo endpoint from the discovery document, if the IdP publishes one."""
+        userinfo_endpoint = self._discovery_doc.get("userinfo_endpoint")
+        return Url.from_string(userinfo_endpoint) if userinfo_endpoint else None
+
+    def issuer(self) -> Optional[str]:
+        """Return the issuer identifier from the discovery document."""
+        return self._discovery_doc.get("issuer")
+
+    def jwks_url(self) -> Optional[Url]:
+        """Return the JWKS endpoint from the discovery document, if the IdP publishes one."""
+        jwks_uri = self._discovery_doc.get("jwks_uri")
+        return Url.from_string(jwks_uri) if jwks_uri else None
+
+    def jwt_validator(self) -> JwtValidator:
+        """Return the validator of the JWTs issued by this IdP, its JWKS is fetched once and cached."""
+        with self._lock:
+            if not self._jwt_validator:
+                jwks_url = self.jwks_url()
+                if not jwks_url:
+                    raise ValueError(f"identity provider '{self.base_url}' does not publish a jwks_uri.")
+                self._jwt_validator = JwtValidator(JwksCache(self._http, str(jwks_url)), issuer=self.issuer())
+            return self._jwt_validator
+
+    def http_client(self) -> ResilientHttpClient:
+        """Return the client, over a pooled session, used for every call to this IdP."""
+        return self._http
+
+
+class IdentityProviderRegistry(ABC):
+    @abstractmethod
+    def get_or_create(self, base_url: Url) -> Oauth2IdentityProvider: ...
+
+
+class ThreadSafeIdentityProviderRegistry(IdentityProviderRegistry):
+    """
+    Keeps one identity provider per issuer, so the discovery document is fetched once
+    and the connection pool of its session is shared by every flow of that issuer.
+    Each issuer also gets its own circuit breaker, which outlives failed discoveries.
+    """
+
+    def __init__(self, resilience: HttpResilienceConfig = HttpResilienceConfig()) -> None:
+        self.resilience = resilience
+        self._lock = threading.Lock()
+        self._creation_locks: Dict[Url, threading.Lock] = {}
+        self._breakers: Dict[Url, CircuitBreaker] = {}
+        self._providers: Dict[Url, Oauth2IdentityProvider] = {}
+
+    def get_or_create(self, base_url: Url) -> Oauth2IdentityProvider:
+        base_url = base_url.normalize_path()
+        with self._lock:
+            provider = self._providers.get(base_url)
+            if provider:
+                return provider
+            creation_lock = self._creation_locks.setdefault(base_url, threading.Lock())
+            breaker = self._breakers.setdefault(base_url, CircuitBreaker(
+                name=str(base_url),
+                failure_threshold=self.resilience.breaker_failure_threshold,
+                reset_timeout=self.resilience.breaker_reset_timeout
+            ))
+
+        # discovery happens outside the registry lock, concurrent creations for the same issuer are serialized
+        with creation_lock:
+            with self._lock:
+                provider = self._providers.get(base_url)
+            if not provider:
+                provider = OidcIdentityProvider(
+                    base_url,
+                    http_client=ResilientHttpClient(requests.Session(), self.resilience, breaker)
+                )
+                with self._lock:
+                    self._providers[base_url] = provider
+        return provider
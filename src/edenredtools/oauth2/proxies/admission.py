@@ -0,0 +1,63 @@
+from contextlib import contextmanager
+import threading
+from typing import Dict, Iterator, Optional
+
+from edenredtools.net.url import Url
+
+
+class AdmissionRejected(Exception):
+    def __init__(self, message: str, status: int, retry_after: int) -> None:
+        super().__init__(message)
+        self.status = status
+        self.retry_after = retry_after
+
+
+class FlowWaiterAdmission:
+    """
+    Bounds the number of requests blocked waiting for authorization flows, per flow and in total.
+    Requests over a limit are rejected immediately instead of holding a server thread until the
+    flow times out: 429 when the flow is saturated, 503 when the whole proxy is.
+    A limit set to None (or 0) is disabled.
+    """
+
+    def __init__(
+        self,
+        max_waiters_per_flow: Optional[int] = None,
+        max_waiters_total: Optional[int] = None,
+        retry_after: int = 5
+    ) -> None:
+        self.max_waiters_per_flow = max_waiters_per_flow or None
+        self.max_waiters_total = max_waiters_total or None
+        self.retry_after = retry_after
+        self._lock = threading.Lock()
+        self._waiters: Dict[Url, int] = {}
+        self._total = 0
+
+    @contextmanager
+    def admit(self, authorize_url: Url) -> Iterator[None]:
+        with self._lock:
+            waiters = self._waiters.get(authorize_url, 0)
+            if self.max_waiters_total and self._total >= self.max_waiters_total:
+                raise AdmissionRejected(
+                    f"Too many requests waiting for authorization flows ({self._total}), retry later.",
+                    status=503,
+                    retry_after=self.retry_after
+                )
+            if self.max_waiters_per_flow and waiters >= self.max_waiters_per_flow:
+                raise AdmissionRejected(
+                    f"Too many requests waiting for this authorization flow ({waiters}), retry later.",
+                    status=429,
+                    retry_after=self.retry_after
+                )
+            self._waiters[authorize_url] = waiters + 1
+            self._total += 1
+        try:
+            yield
+        finally:
+            with self._lock:
+                self._total -= 1
+                remaining = self._waiters[authorize_url] - 1
+                if remaining:
+                    self._waiters[authorize_url] = remaining
+                else:
+                    del self._waiters[authorize_url]
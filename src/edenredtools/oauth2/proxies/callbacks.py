@@ -0,0 +1,53 @@
+import threading
+from typing import Dict, Tuple
+
+from edenredtools.net.url import Url
+
+CallbackRoute = Tuple[str, int, str]
+
+
+class CallbackRouteTable:
+    """
+    The (host, port, path) routes on which callbacks of in-progress flows are expected. Requests on any other
+    route are rejected by a single lookup, before the state is decoded. Routes are reference counted, flows
+    sharing a callback url keep it registered until the last of them finishes.
+    """
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._routes: Dict[CallbackRoute, int] = {}
+
+    @staticmethod
+    def route_of(callback_url: Url) -> CallbackRoute:
+        return callback_url.hostname().lower(), callback_url.port(), callback_url.path()
+
+    @staticmethod
+    def route_of_request(host: str, scheme: str, path: str) -> CallbackRoute:
+        origin = Url.from_host(scheme, host)
+        try:
+            port = origin.port()
+        except ValueError:
+            # malformed port, matches no route
+            port = -1
+        return origin.hostname().lower(), port, path
+
+    def register(self, callback_url: Url) -> None:
+        route = self.route_of(callback_url)
+        with self._lock:
+            self._routes[route] = self._routes.get(route, 0) + 1
+
+    def release(self, callback_url: Url) -> None:
+        route = self.route_of(callback_url)
+        with self._lock:
+            remaining = self._routes.get(route, 0) - 1
+            if remaining > 0:
+                self._routes[route] = remaining
+            else:
+                self._routes.pop(route, None)
+
+    def __contains__(self, route: CallbackRoute) -> bool:
+        # a dict read is atomic, the lookup does not need the lock
+        return route in self._routes
+
+    def __len__(self) -> int:
+        return len(self._routes)
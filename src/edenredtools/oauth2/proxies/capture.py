@@ -0,0 +1,70 @@
+from datetime import datetime as dt
+import datetime
+import hashlib
+import hmac
+import json
+import os
+import queue
+import secrets
+import threading
+import time
+from typing import Any, Dict, Optional
+
+CAPTURE_FORMAT_VERSION = 1
+
+
+class TrafficCapture:
+    """
+    Records the token and callback requests served by the proxy as JSON lines, for `oauth2 replay`:
+
+        {"kind": "capture", "version": 1, "started_at": "..."}
+        {"t": 0.0132, "kind": "token", "key": "9f2c...", "callback": "51ab...", "status": 200, "duration_ms": 1.2, "source": "cache"}
+        {"t": 0.4127, "kind": "callback", "key": "9f2c...", "status": 200, "duration_ms": 3.4}
+
+    `t` is the request start, in seconds since the capture started. Authorize keys and callback urls are
+    replaced by a keyed hash whose salt is never written, so a trace only tells requests for the same key
+    apart; tokens, codes, states and secrets are never recorded. Records are written by a background thread.
+    """
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        self._salt = secrets.token_bytes(16)
+        self._started_at = time.monotonic()
+        self._records: "queue.SimpleQueue[Optional[Dict[str, Any]]]" = queue.SimpleQueue()
+        self._file = os.fdopen(os.open(path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600), "w", encoding="utf-8")
+        self._write({
+            "kind": "capture",
+            "version": CAPTURE_FORMAT_VERSION,
+            "started_at": dt.now(datetime.timezone.utc).isoformat()
+        })
+        self._writer = threading.Thread(target=self._write_records, name="traffic-capture", daemon=True)
+        self._writer.start()
+
+    def anonymize(self, value: Optional[str]) -> Optional[str]:
+        if value is None:
+            return None
+        return hmac.new(self._salt, value.encode("utf-8"), hashlib.sha256).hexdigest()[:16]
+
+    def record(self, kind: str, started_at: float, **fields: Any) -> None:
+        """
+        :param started_at: `time.monotonic()` at the start of the request.
+        """
+        self._records.put({"t": round(started_at - self._started_at, 6), "kind": kind, **fields})
+
+    def close(self) -> None:
+        self._records.put(None)
+        self._writer.join()
+        self._file.close()
+
+    def _write_records(self) -> None:
+        while True:
+            record = self._records.get()
+            if record is None:
+                self._file.flush()
+                return
+            self._write(record)
+            if self._records.empty():
+                self._file.flush()
+
+    def _write(self, record: Dict[str, Any]) -> None:
+        self._file.write(json.dumps(record, separators=(",", ":")) + "\n")
@@ -0,0 +1,54 @@
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+import secrets
+import threading
+from typing import Callable, Dict, Optional
+
+
+class CodeExchangePipeline:
+    """
+    Runs authorization code exchanges on a small worker pool, off the callback request, so the browser
+    gets its page without waiting for the identity provider. The outcome of the last `max_outcomes`
+    exchanges is kept so the callback page can poll it.
+    """
+    PENDING = "pending"
+    DONE = "done"
+    ERROR = "error"
+
+    def __init__(self, max_workers: int = 4, max_outcomes: int = 256) -> None:
+        self.max_outcomes = max_outcomes
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="oauth2-exchange")
+        self._lock = threading.Lock()
+        self._outcomes: "OrderedDict[str, Dict[str, Optional[str]]]" = OrderedDict()
+
+    def submit(self, exchange: Callable[[], None]) -> str:
+        """
+        Schedules `exchange` and returns the id its outcome can be polled with.
+        """
+        exchange_id = secrets.token_urlsafe(16)
+        self._record(exchange_id, self.PENDING)
+        self._executor.submit(self._run, exchange_id, exchange)
+        return exchange_id
+
+    def status(self, exchange_id: str) -> Optional[Dict[str, Optional[str]]]:
+        with self._lock:
+            outcome = self._outcomes.get(exchange_id)
+            return dict(outcome) if outcome else None
+
+    def shutdown(self) -> None:
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+    def _run(self, exchange_id: str, exchange: Callable[[], None]) -> None:
+        try:
+            exchange()
+        except Exception as e:
+            self._record(exchange_id, self.ERROR, str(e))
+        else:
+            self._record(exchange_id, self.DONE)
+
+    def _record(self, exchange_id: str, status: str, error: Optional[str] = None) -> None:
+        with self._lock:
+            self._outcomes[exchange_id] = {"status": status, "error": error}
+            self._outcomes.move_to_end(exchange_id)
+            while len(self._outcomes) > self.max_outcomes:
+                self._outcomes.popitem(last=False)
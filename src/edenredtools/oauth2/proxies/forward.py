@@ -0,0 +1,134 @@
+from http.cookiejar import DefaultCookiePolicy
+import logging
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+import requests
+from requests.adapters import HTTPAdapter
+from requests.auth import AuthBase
+
+from edenredtools.oauth2.proxies.models import LocalProxyForwardRoute, LocalProxyTokenRequest
+from edenredtools.system.logs import log_event
+
+logger = logging.getLogger(__name__)
+
+
+class _NoAuth(AuthBase):
+    # set on the session, keeps `requests` from replacing the injected token with ~/.netrc credentials
+    def __call__(self, r: requests.PreparedRequest) -> requests.PreparedRequest:
+        return r
+
+
+class Oauth2ForwardProxy:
+    """
+    Forwards requests to the upstream of a named route with the route's bearer token injected, over pooled
+    keep-alive connections, streaming the upstream response back. A 401 from the upstream to a cached token
+    invalidates it and the request is retried once with a newly acquired one; a token that was just obtained
+    from an authorization flow is not retried, the 401 is returned as is.
+    """
+    # RFC 7230 section 6.1, never forwarded by proxies
+    HOP_BY_HOP_HEADERS = frozenset({
+        "connection", "keep-alive", "proxy-authenticate", "proxy-authorization",
+        "te", "trailer", "transfer-encoding", "upgrade",
+    })
+    _REQUEST_HEADERS_SET_BY_PROXY = frozenset({"host", "authorization", "content-length"})
+    STREAM_CHUNK_SIZE = 64 * 1024
+
+    def __init__(
+        self,
+        routes: List[LocalProxyForwardRoute],
+        acquire_token: Callable[[LocalProxyTokenRequest], Tuple[dict, str]],
+        invalidate_token: Callable[[dict], int],
+        timeout: Tuple[float, float] = (3.05, 60.0),
+        pool_maxsize: int = 32
+    ) -> None:
+        self.routes: Dict[str, LocalProxyForwardRoute] = {route.name: route for route in routes}
+        self.acquire_token = acquire_token
+        self.invalidate_token = invalidate_token
+        self.timeout = timeout
+        self.session = requests.Session()
+        # shared by all the local clients: upstream cookies are never stored, each request only carries
+        # the `Cookie` header of its own client
+        self.session.cookies.set_policy(DefaultCookiePolicy(allowed_domains=[]))
+        self.session.auth = _NoAuth()
+        # one connection pool per upstream host, shared by the server threads
+        adapter = HTTPAdapter(pool_connections=max(len(self.routes), 1), pool_maxsize=pool_maxsize)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+    def get_route(self, name: str) -> Optional[LocalProxyForwardRoute]:
+        return self.routes.get(name)
+
+    def forward(
+        self,
+        route: LocalProxyForwardRoute,
+        method: str,
+        path: str,
+        query_string: bytes,
+        headers: Iterable[Tuple[str, str]],
+        body: bytes
+    ) -> requests.Response:
+        """
+        Sends the request upstream and returns the streamed response, whose body is left unread.
+        Token acquisition errors are raised as they are.
+        """
+        url = self.upstream_url(route, path, query_string)
+        forwarded_headers = self.filter_request_headers(headers)
+        token_request = route.token_request()
+
+        for attempt in range(2):
+            token, source = self.acquire_token(token_request)
+            forwarded_headers["Authorization"] = f"{token.get('token_type') or 'Bearer'} {token['access_token']}"
+            upstream = self.session.request(
+                method,
+                url,
+                headers=forwarded_headers,
+                data=body,
+                stream=True,
+                allow_redirects=False,
+                timeout=self.timeout
+            )
+            # a retry would start another (interactive) flow for a token the upstream rejects anyway
+            if upstream.status_code != 401 or attempt or source != "cache":
+                return upstream
+
+            upstream.close()
+            self.invalidate_token(token)
+            log_event(logger, "forward.token_rejected", route=route.name, upstream=url)
+        return upstream
+
+    @staticmethod
+    def upstream_url(route: LocalProxyForwardRoute, path: str, query_string: bytes) -> str:
+        url = f"{route.upstream.encoded_string().rstrip('/')}/{path}"
+        if query_string:
+            url = f"{url}?{query_string.decode('latin-1')}"
+        return url
+
+    @classmethod
+    def filter_request_headers(cls, headers: Iterable[Tuple[str, str]]) -> Dict[str, str]:
+        headers = list(headers)
+        excluded = cls.HOP_BY_HOP_HEADERS | cls._REQUEST_HEADERS_SET_BY_PROXY | cls._connection_tokens(headers)
+        return {name: value for name, value in headers if name.lower() not in excluded}
+
+    @classmethod
+    def response_headers(cls, upstream: requests.Response) -> List[Tuple[str, str]]:
+        # raw headers keep repeated fields (e.g. Set-Cookie) apart
+        headers = list(upstream.raw.headers.items())
+        excluded = cls.HOP_BY_HOP_HEADERS | cls._connection_tokens(headers)
+        return [(name, value) for name, value in headers if name.lower() not in excluded]
+
+    @classmethod
+    def response_body(cls, upstream: requests.Response) -> Iterator[bytes]:
+        # passed through as sent (still encoded), matching the forwarded Content-Encoding and Content-Length
+        return upstream.raw.stream(cls.STREAM_CHUNK_SIZE, decode_content=False)
+
+    @staticmethod
+    def _connection_tokens(headers: Iterable[Tuple[str, str]]) -> frozenset:
+        # headers named in `Connection` are hop-by-hop too
+        return frozenset(
+            token.strip().lower()
+            for name, value in headers if name.lower() == "connection"
+            for token in value.split(",")
+        )
+
+    def close(self) -> None:
+        self.session.close()
@@ -1,20 +1,54 @@
 from abc import ABC, abstractmethod
 import base64
+from datetime import datetime as dt
+import datetime
+import hashlib
+import json
+import logging
+import math
 import os
 import threading
-from typing import Any
-from flask import Flask, Response, render_template, request, jsonify
+import time
+from typing import Any, Iterator, List, Optional, Set, Tuple, Type
+from flask import Flask, Response, g, has_request_context, redirect, render_template, request, jsonify
 from pydantic import ValidationError
+from werkzeug.serving import BaseWSGIServer, make_server
 
 from edenredtools.oauth2.flows.authorization import LocalProxyTokenRequestState, Oauth2AuthorizationFlow
 from edenredtools.oauth2.flows.factory import Oauth2AuthorizationFlowFactory
-from edenredtools.oauth2.flows.registry import AuthorizationFlowRegistry
-from edenredtools.oauth2.identity_provider import OidcIdentityProvider
-from edenredtools.oauth2.proxies.models import Oauth2LocalProxyConfig, LocalProxyTokenRequest
+from edenredtools.oauth2.flows.registry import AuthorizationFlowRegistry, FlowFailedRecently, FlowState
+from edenredtools.oauth2.identity_provider import IdentityProviderRegistry
+from edenredtools.oauth2.proxies.admission import AdmissionRejected, FlowWaiterAdmission
+from edenredtools.oauth2.proxies.callbacks import CallbackRoute, CallbackRouteTable
+from edenredtools.oauth2.proxies.capture import TrafficCapture
+from edenredtools.oauth2.proxies.exchange import CodeExchangePipeline
+from edenredtools.oauth2.proxies.forward import Oauth2ForwardProxy
+from edenredtools.oauth2.proxies.models import (
+    LocalProxyForwardRoutes,
+    LocalProxyProfileRequest,
+    LocalProxyResetRequest,
+    LocalProxySubscribeRequest,
+    LocalProxyTokenRequest,
+    LocalProxyUserInfoRequest,
+    LocalProxyValidateRequest,
+    LocalProxyWarmupManifest,
+    Oauth2LocalProxyConfig
+)
+from edenredtools.oauth2.proxies.warmup import Oauth2LocalProxyWarmup
+from edenredtools.oauth2.tokens.events import TokenEventBroker, TokenSubscription, TooManySubscribers
+from edenredtools.oauth2.tokens.jwt import JwtValidationError
 from edenredtools.oauth2.tokens.registry import Oauth2TokenRegistry
+from edenredtools.oauth2.tokens.userinfo import UserInfoCache
+from edenredtools.oauth2.tokens.validator import TokenValidator
+from edenredtools.system.broswer import CoalescingBrowserLauncher
+from edenredtools.system.logs import log_event
+from edenredtools.system.profiling import ProfilerBusy, SamplingProfiler
 from edenredtools.system.registry import SystemRegistry
+from edenredtools.system.sockets import SystemdSockets
 from edenredtools.net.url import Url
 
+logger = logging.getLogger(__name__)
+
 
 class Oauth2LocalProxy(ABC):
     def __init__(
@@ -22,42 +56,188 @@ class Oauth2LocalProxy(ABC):
         system: SystemRegistry,
         token_registry: Oauth2TokenRegistry,
         flow_registry: AuthorizationFlowRegistry,
+        identity_provider_registry: IdentityProviderRegistry,
         config: Oauth2LocalProxyConfig
     ) -> None:
         self.system = system
         self.token_registry = token_registry
         self.flow_regitry = flow_registry
+        self.identity_provider_registry = identity_provider_registry
         self.config = config
 
     @abstractmethod
     def handle_health_check(self) -> None: ...
 
     @abstractmethod
-    def handle_oauth2_callback(self) -> None: ...
+    def handle_oauth2_callback(self, route: CallbackRoute) -> None: ...
 
     @abstractmethod
     def handle_get_token(self) -> None: ...
 
+    @abstractmethod
+    def acquire_token(self, token_request: LocalProxyTokenRequest) -> dict: ...
+
+    @abstractmethod
+    def acquire_token_with_source(self, token_request: LocalProxyTokenRequest) -> Tuple[dict, str]: ...
+
+    @abstractmethod
+    def user_info(self, token_request: LocalProxyTokenRequest, userinfo: bool = True) -> dict: ...
+
+    @abstractmethod
+    def handle_user_info(self) -> None: ...
+
+    @abstractmethod
+    def handle_validate_token(self) -> None: ...
+
+    @abstractmethod
+    def handle_forward(self, name: str, path: str) -> None: ...
+
 
 class FlaskOauth2LocalProxy(Oauth2LocalProxy):
+    _PENDING_PAGE_REFRESH_SECONDS = 3
+    # tokens are served while valid for at least this long, see `Oauth2TokenRegistry.read_valid_token`
+    _TOKEN_BUFFER_SECONDS = 10
+    _FORWARDED_METHODS = ["GET", "HEAD", "POST", "PUT", "PATCH", "DELETE", "OPTIONS"]
+    _LOOPBACK_ADDRESSES = ("127.0.0.1", "::1", "::ffff:127.0.0.1")
+
     def __init__(self, *args, **kwargs) -> None:
         super().__init__(*args, **kwargs)
+        self.capture = TrafficCapture(self.config.capture_file) if self.config.capture_file else None
         self.app = self._configure_flask()
+        self._servers: List[BaseWSGIServer] = []
+        self.admission = FlowWaiterAdmission(
+            max_waiters_per_flow=self.config.max_waiters_per_flow,
+            max_waiters_total=self.config.max_waiters_total,
+            retry_after=self.config.admission_retry_after
+        )
+        self.browser_launcher = CoalescingBrowserLauncher(
+            browser=self.system.broswer,
+            url=f"http://127.0.0.1:{self.config.port}/proxy/pending",
+            min_interval=self.config.browser_launch_interval,
+            seen_ttl=2 * self._PENDING_PAGE_REFRESH_SECONDS
+        )
+        self.callback_routes = CallbackRouteTable()
+        self.exchange_pipeline = CodeExchangePipeline(max_workers=self.config.exchange_workers)
+        self.token_events = TokenEventBroker(
+            max_subscribers=self.config.max_token_subscribers,
+            max_pending=self.config.subscriber_buffer_size
+        )
+        self.token_registry.add_listener(self.token_events)
+        self.user_info_cache = UserInfoCache(self.identity_provider_registry)
+        self.token_registry.add_listener(self.user_info_cache)
+        self.profiler = SamplingProfiler()
+        self.forwarder: Optional[Oauth2ForwardProxy] = None
+        if self.config.forward_routes:
+            self.forwarder = Oauth2ForwardProxy(
+                routes=LocalProxyForwardRoutes.from_file(self.config.forward_routes).routes,
+                acquire_token=self.acquire_token_with_source,
+                invalidate_token=self.token_registry.invalidate,
+                timeout=(3.05, self.config.forward_read_timeout)
+            )
         
     def _configure_flask(self) -> Flask:
         app = Flask(__name__, template_folder=os.path.join(os.path.dirname(__file__), 'templates'))
         app.route("/proxy/health", methods=["GET"])(self.handle_health_check)
-        app.route("/proxy/token", methods=["POST"])(self.handle_get_token)
+        app.route("/proxy/token", methods=["GET", "POST"])(self.handle_get_token)
+        app.route("/proxy/pending", methods=["GET"])(self.handle_pending_authorizations)
+        app.route("/proxy/exchange/<exchange_id>", methods=["GET"])(self.handle_exchange_status)
+        app.route("/proxy/userinfo", methods=["GET", "POST"])(self.handle_user_info)
+        app.route("/proxy/validate", methods=["POST"])(self.handle_validate_token)
+        app.route("/proxy/flows/reset", methods=["POST"])(self.handle_reset_flow_failures)
+        app.route("/proxy/subscribe", methods=["GET"])(self.handle_subscribe)
+        app.route("/proxy/debug/profile", methods=["GET"])(self.handle_debug_profile)
+        app.route("/proxy/debug/heap", methods=["GET"])(self.handle_debug_heap)
+        app.route(
+            "/proxy/forward/<name>/", defaults={"path": ""}, methods=self._FORWARDED_METHODS
+        )(self.handle_forward)
+        app.route("/proxy/forward/<name>/<path:path>", methods=self._FORWARDED_METHODS)(self.handle_forward)
         app.route('/<path:path>', methods=["GET"])(self.handle_catch_all)
+        if self.capture:
+            app.before_request(self._capture_start)
+            app.after_request(self._capture_request)
         return app
 
+    def _capture_start(self) -> None:
+        g.started_at = time.monotonic()
+
+    def _capture_request(self, response: Response) -> Response:
+        if request.endpoint == "handle_get_token":
+            kind = "token"
+        elif request.endpoint == "handle_catch_all":
+            kind = "callback"
+        else:
+            return response
+
+        authorize_url = g.get("authorize_url")
+        fields = {
+            "key": self.capture.anonymize(authorize_url.canonical_string() if authorize_url else None),
+            "status": response.status_code,
+            "duration_ms": round((time.monotonic() - g.started_at) * 1000, 3),
+        }
+        if kind == "token":
+            fields["callback"] = self.capture.anonymize(g.get("callback_url"))
+            fields["source"] = g.get("token_source")
+        self.capture.record(kind, g.started_at, **fields)
+        return response
+
     def handle_health_check(self) -> Any:
         return {"status": "ok"}, 200
     
+    def _is_loopback_request(self) -> bool:
+        return request.remote_addr in self._LOOPBACK_ADDRESSES
+
+    def handle_pending_authorizations(self) -> Any:
+        """
+        Lists the authorization urls (state included) of the pending consents, only to loopback clients.
+        """
+        if not self._is_loopback_request():
+            return Response("The pending authorizations are only available from the loopback interface.", status=403)
+
+        pending = []
+        preparing = 0
+        for authorize_url, flow_state in self.flow_regitry.pending():
+            if flow_state.callback_received():
+                continue
+            flow = flow_state.get_flow()
+            if not flow or flow_state.in_error():
+                preparing += 1
+                continue
+            pending.append({
+                "identity_provider": authorize_url.hostname(),
+                "client_id": flow.authorize_params.client_id,
+                "scope": flow.authorize_params.scope,
+                "url": flow.authorization_request_url()
+            })
+
+        # a single consent to give: skip the landing page
+        if len(pending) == 1 and not preparing:
+            return redirect(pending[0]["url"])
+
+        self.browser_launcher.notify_seen()
+        return render_template(
+            "pending_consent.html",
+            pending=pending,
+            preparing=preparing,
+            refresh_seconds=self._PENDING_PAGE_REFRESH_SECONDS
+        )
+
+    def handle_exchange_status(self, exchange_id: str) -> Any:
+        status = self.exchange_pipeline.status(exchange_id)
+        if not status:
+            return {"status": "unknown"}, 404
+        return status, 200
+
     def handle_catch_all(self, path: str) -> Any:
-        return self.handle_oauth2_callback()
+        # favicons, scanners and stale tabs are rejected without decoding anything
+        route = CallbackRouteTable.route_of_request(request.host, request.scheme, request.path)
+        if route not in self.callback_routes:
+            return Response("Not found", status=404)
+        return self.handle_oauth2_callback(route)
             
-    def handle_oauth2_callback(self) -> Any:        
+    def handle_oauth2_callback(self, route: CallbackRoute) -> Any:
+        """
+        Handles a callback received on `route`, the (host, port, path) of the request.
+        """
         authorize_url = None
         try:
             state_param = request.args.get("state")
@@ -79,9 +259,11 @@ class FlaskOauth2LocalProxy(Oauth2LocalProxy):
 
             authorize_url = Oauth2AuthorizationFlowFactory.create_authorize_url(state.authorize_url)
             callback_url = Url.from_string(state.callback_url.encoded_string())
+            g.authorize_url = authorize_url
             
             # 2. Validate hostname
-            if request.host != callback_url.hostname():
+            host, _, _ = route
+            if host != callback_url.hostname().lower():
                 raise ValueError("Request rejected: unexpected hostname.")
 
             # 3. Validate path
@@ -106,96 +288,465 @@ class FlaskOauth2LocalProxy(Oauth2LocalProxy):
                 raise RuntimeError("Flow object is missing in flow state.")
 
             # 5. Dispatch by response type
-            if flow.authorize_params.response_type == "code":
-                self._handle_oauth2_code_callback(authorize_url, flow)
-                self.flow_regitry.mark_done(authorize_url)
-                return render_template("redirect_callback.html")
-            else:
+            if flow.authorize_params.response_type != "code":
                 raise ValueError(f"Unsupported response_type: {flow.authorize_params.response_type}")
 
+            if not flow_state.claim_callback():
+                return Response("Authorization code already received for this flow.", status=409)
+
+            # 6. Exchange the code in the background, waiters are woken up through the flow state
+            exchange_id = self._handle_oauth2_code_callback(authorize_url, flow)
+            log_event(logger, "callback.received", authorize_url=authorize_url, path=request.path)
+            return render_template(
+                "redirect_callback.html",
+                exchange_id=exchange_id,
+                pending=self._count_awaiting_consent() if self.config.coalesce_browser_launches else 0
+            )
+
         except ValueError as e:
+            log_event(logger, "callback.failed", logging.WARNING, path=request.path, status=400, error=str(e))
             if authorize_url: self.flow_regitry.mark_error(authorize_url, e)
             return Response(f"Proxy authorization callback failed: {str(e)}", status=400)
 
         except Exception as e:
+            log_event(logger, "callback.failed", logging.WARNING, path=request.path, status=500, error=str(e))
             if authorize_url: self.flow_regitry.mark_error(authorize_url, e)
             return Response(f"Proxy authorization callback failed: {str(e)}", status=500)
 
-    def _handle_oauth2_code_callback(self, authorize_url: Url, flow: Oauth2AuthorizationFlow) -> Any:
+    def _count_awaiting_consent(self) -> int:
+        return sum(1 for _, flow_state in self.flow_regitry.pending() if not flow_state.callback_received())
+
+    def _handle_oauth2_code_callback(self, authorize_url: Url, flow: Oauth2AuthorizationFlow) -> str:
         code = request.args.get("code")
         state = request.args.get("state")
-        token_response = flow.exchange_code(code, state)
-        self.token_registry.set(authorize_url, token_response)
 
-    def handle_get_token(self) -> Any:
-        token_request = None
-        try:
-            token_request = LocalProxyTokenRequest(**request.form.to_dict())
+        def exchange() -> None:
+            try:
+                token_response = flow.exchange_code(code, state)
+                self.token_registry.set(authorize_url, token_response)
+            except Exception as e:
+                log_event(logger, "exchange.failed", logging.WARNING, authorize_url=authorize_url, error=str(e))
+                self.flow_regitry.mark_error(authorize_url, e)
+                raise
+            log_event(logger, "exchange.completed", authorize_url=authorize_url)
+            self.flow_regitry.mark_done(authorize_url)
+
+        return self.exchange_pipeline.submit(exchange)
 
+    def _parse_token_request(self, model: Type[LocalProxyTokenRequest]) -> Any:
+        """
+        Parses the parameters of `/proxy/token` (see `handle_get_token`) and of the endpoints taking the same ones.
+        Returns the parsed request, or the error response to send.
+        """
+        if request.method == "GET" and "client_secret" in request.args:
+            return Response("client_secret must not be sent in the query string, use POST.", status=400)
+        try:
+            params = request.form if request.method == "POST" else request.args
+            return model(**params.to_dict())
         except ValidationError as ve:
             return Response(f"Invalid request: {ve}", status=400)
-        
+
+    @staticmethod
+    def _token_refused_response(e: Exception, authorize_url: Any) -> Response:
+        """
+        Response to a token acquisition refused by admission control (`AdmissionRejected`)
+        or by the backoff of a flow that just failed (`FlowFailedRecently`).
+        """
+        if isinstance(e, AdmissionRejected):
+            log_event(logger, "token.rejected", logging.WARNING, authorize_url=authorize_url, status=e.status)
+            return Response(str(e), status=e.status, headers={"Retry-After": str(e.retry_after)})
+        log_event(logger, "token.backoff", authorize_url=authorize_url, failures=e.failures)
+        return Response(str(e), status=503, headers={"Retry-After": str(math.ceil(e.retry_after))})
+
+    def handle_get_token(self) -> Any:
+        """
+        POST with a form, or GET with query parameters so that standard HTTP client caches can reuse responses
+        (secrets must not end up in urls, GET requests cannot carry a `client_secret`).
+        """
+        token_request = self._parse_token_request(LocalProxyTokenRequest)
+        if isinstance(token_request, Response):
+            return token_request
+
+        authorize_url = token_request.authorize_url
+        try:
+            token = self.acquire_token(token_request)
+        except (AdmissionRejected, FlowFailedRecently) as e:
+            return self._token_refused_response(e, authorize_url)
+        except LookupError as e:
+            log_event(logger, "token.error", logging.ERROR, authorize_url=authorize_url, error=str(e))
+            return Response(str(e), 500)
+        except Exception as e:
+            log_event(logger, "token.error", logging.WARNING, authorize_url=authorize_url, error=str(e))
+            return Response(f"Error occurred: {e}")
+
+        return self._token_response(token)
+
+    def _token_response(self, token: dict) -> Response:
+        """
+        Token response cacheable by the client until the token leaves its validity buffer, with an ETag
+        identifying the token version: revalidations (If-None-Match) of an unchanged token get a 304.
+        """
+        expiration = TokenValidator.expires_at(token)
+        etag = hashlib.sha256(f"{token.get('access_token')}|{expiration}".encode("utf-8")).hexdigest()[:32]
+        if expiration:
+            remaining = (expiration - dt.now(datetime.timezone.utc)).total_seconds()
+            cache_control = f"private, max-age={max(0, int(remaining) - self._TOKEN_BUFFER_SECONDS)}"
+        else:
+            cache_control = "private, no-cache"
+
+        response = Response(status=304) if request.if_none_match.contains_weak(etag) else jsonify(token)
+        response.set_etag(etag)
+        response.headers["Cache-Control"] = cache_control
+        return response
+
+    def acquire_token(self, token_request: LocalProxyTokenRequest) -> dict:
+        """
+        Returns a valid token for the request, starting the authorization flow or joining
+        the one already in progress for the same authorize URL when it is not cached.
+        """
+        return self.acquire_token_with_source(token_request)[0]
+
+    def acquire_token_with_source(self, token_request: LocalProxyTokenRequest) -> Tuple[dict, str]:
+        """
+        Same as `acquire_token`, also returning where the token comes from: `cache` or `flow`.
+        """
         authorize_url = Oauth2AuthorizationFlowFactory.create_authorize_url(token_request.authorize_url)
         callback_url = Url.from_string(token_request.callback_url.encoded_string())
+        if has_request_context():
+            g.authorize_url, g.callback_url = authorize_url, callback_url.to_string()
 
+        # cache hits never go through admission control, they cannot be starved by flow waiters
         token = self.token_registry.read_valid_token(authorize_url)
         if token:
-            return jsonify(token)
-    
-        flow_state = self.flow_regitry.get_or_create(authorize_url)
-        if flow_state.is_initiator():
-            def run_flow():
-                try:
-                    if self.config.autoconfigure_system:
-                        self._autoconfigure_system(callback_url)
-                        
-                    state = Oauth2AuthorizationFlowFactory.create_state(
-                        authorize_url=authorize_url, 
-                        callback_url=callback_url, 
-                        secret=self.config.fingerprint_secret
-                    )
-                    
-                    flow = Oauth2AuthorizationFlow(
-                        identity_provider=OidcIdentityProvider(authorize_url.base_url()),
-                        authorize_params=Oauth2AuthorizationFlowFactory.create_params(authorize_url, state),
-                        client_secret=token_request.client_secret,
-                        browser=self.system.broswer
-                    )   
-                    flow_state.set_flow(flow)
-                    flow.commence()
-                except Exception as e:
-                    self.flow_regitry.mark_error(authorize_url, e)
+            log_event(logger, "token.cache_hit", authorize_url=authorize_url)
+            if has_request_context():
+                g.token_source = "cache"
+            return token, "cache"
 
-            threading.Thread(target=run_flow, daemon=True).start()
-                
-        try:
-            flow_state.wait_for_flow(timeout=self.config.authorize_flow_timeout)
+        started_at = time.monotonic()
+        if has_request_context():
+            g.token_source = "flow"
+        with self.admission.admit(authorize_url):
+            flow_state = self.flow_regitry.get_or_create(authorize_url)
+            initiator = flow_state.is_initiator()
+            if initiator:
+                # registered before the browser can be opened, released once the flow is over
+                self.callback_routes.register(callback_url)
+                self._start_flow(flow_state, authorize_url, callback_url, token_request.client_secret)
+                    
+            try:
+                flow_state.wait_for_flow(timeout=self.config.authorize_flow_timeout)
 
-        except TimeoutError as e:
-            self.flow_regitry.mark_error(authorize_url, e)
-            return Response(f"Error occurred: {e}")
+            except TimeoutError as e:
+                self.flow_regitry.mark_error(authorize_url, e)
+                raise
+            finally:
+                if initiator:
+                    self.callback_routes.release(callback_url)
         
         if flow_state.in_error():
-            return Response(f"Error occurred: {flow_state.get_error()}")
+            raise flow_state.get_error()
         
         token = self.token_registry.read_valid_token(authorize_url)
         if token:
-            return jsonify(token)
+            log_event(
+                logger, "token.flow_served",
+                authorize_url=authorize_url,
+                duration_ms=round((time.monotonic() - started_at) * 1000, 1)
+            )
+            return token, "flow"
         
-        return Response(f"authorization flow completed successfully but could not find related token", 500)
+        raise LookupError("authorization flow completed successfully but could not find related token")
+
+    def _start_flow(
+        self,
+        flow_state: FlowState,
+        authorize_url: Url,
+        callback_url: Url,
+        client_secret: Optional[str]
+    ) -> None:
+        def run_flow():
+            try:
+                if self.config.autoconfigure_system:
+                    self._autoconfigure_system(callback_url)
+                    
+                state = Oauth2AuthorizationFlowFactory.create_state(
+                    authorize_url=authorize_url, 
+                    callback_url=callback_url, 
+                    secret=self.config.fingerprint_secret
+                )
+                
+                identity_provider = self.identity_provider_registry.get_or_create(authorize_url.base_url())
+                # discovery may be cached: no browser is opened on a dead IdP, waiters fail fast instead
+                identity_provider.http_client().breaker.check()
+                flow = Oauth2AuthorizationFlow(
+                    identity_provider=identity_provider,
+                    authorize_params=Oauth2AuthorizationFlowFactory.create_params(authorize_url, state),
+                    client_secret=client_secret,
+                    browser=self.system.broswer
+                )   
+                flow_state.set_flow(flow)
+                if self.config.coalesce_browser_launches:
+                    self.browser_launcher.request_launch()
+                else:
+                    flow.commence()
+                log_event(logger, "flow.commenced", authorize_url=authorize_url, callback_url=callback_url)
+            except Exception as e:
+                self.flow_regitry.mark_error(authorize_url, e)
+
+        threading.Thread(target=run_flow, daemon=True).start()
+
+    def user_info(self, token_request: LocalProxyTokenRequest, userinfo: bool = True) -> dict:
+        """
+        Returns the `id_token` claims and, if `userinfo`, the IdP userinfo of the user of the token of the request,
+        acquired as for `/proxy/token`. Both are cached until the token is replaced or expires.
+        """
+        token = self.acquire_token(token_request)
+        authorize_url = Oauth2AuthorizationFlowFactory.create_authorize_url(token_request.authorize_url)
+        expiration = TokenValidator.expires_at(token)
+        return {
+            "claims": self.user_info_cache.claims(authorize_url, token),
+            "userinfo": self.user_info_cache.userinfo(authorize_url, token) if userinfo else None,
+            "expires_at": expiration.isoformat() if expiration else None,
+        }
+
+    def handle_user_info(self) -> Any:
+        """
+        Same parameters as `/proxy/token`, plus `userinfo=false` to skip the userinfo endpoint.
+        """
+        user_info_request = self._parse_token_request(LocalProxyUserInfoRequest)
+        if isinstance(user_info_request, Response):
+            return user_info_request
+
+        try:
+            user_info = self.user_info(user_info_request, userinfo=user_info_request.userinfo)
+        except (AdmissionRejected, FlowFailedRecently) as e:
+            return self._token_refused_response(e, user_info_request.authorize_url)
+        except Exception as e:
+            log_event(
+                logger, "userinfo.failed", logging.WARNING,
+                authorize_url=user_info_request.authorize_url, error=str(e)
+            )
+            return Response(f"Userinfo lookup failed: {e}", status=502)
+
+        response = jsonify(user_info)
+        response.headers["Cache-Control"] = "private, no-cache"
+        return response
+
+    def handle_validate_token(self) -> Any:
+        try:
+            validate_request = LocalProxyValidateRequest(**request.form.to_dict())
+        except ValidationError as ve:
+            return Response(f"Invalid request: {ve}", status=400)
+
+        authorize_url = Oauth2AuthorizationFlowFactory.create_authorize_url(validate_request.authorize_url)
+        try:
+            validator = self.identity_provider_registry.get_or_create(authorize_url.base_url()).jwt_validator()
+            claims = validator.validate(validate_request.token, audience=validate_request.audience)
+        except JwtValidationError as e:
+            return jsonify({"valid": False, "error": str(e)}), 401
+        except Exception as e:
+            return Response(f"Token validation failed: {e}", status=502)
+
+        return jsonify({"valid": True, "claims": claims})
+
+    def handle_reset_flow_failures(self) -> Any:
+        """
+        Ends the failure backoff of `authorize_url`, or of every authorize url when it is omitted.
+        """
+        try:
+            reset_request = LocalProxyResetRequest(**request.form.to_dict())
+        except ValidationError as ve:
+            return Response(f"Invalid request: {ve}", status=400)
+
+        authorize_url = None
+        if reset_request.authorize_url:
+            authorize_url = Oauth2AuthorizationFlowFactory.create_authorize_url(reset_request.authorize_url)
+        reset = self.flow_regitry.reset_failures(authorize_url)
+        log_event(logger, "flow.failures_reset", authorize_url=authorize_url, reset=reset)
+        return jsonify({"reset": reset})
+
+    def handle_subscribe(self) -> Any:
+        try:
+            subscribe_request = LocalProxySubscribeRequest(**request.args.to_dict())
+        except ValidationError as ve:
+            return Response(f"Invalid request: {ve}", status=400)
+
+        authorize_url = None
+        if subscribe_request.authorize_url:
+            authorize_url = Oauth2AuthorizationFlowFactory.create_authorize_url(subscribe_request.authorize_url)
+        try:
+            subscription = self.token_events.subscribe(authorize_url)
+        except TooManySubscribers as e:
+            return Response(str(e), status=503, headers={"Retry-After": str(self.config.admission_retry_after)})
+
+        log_event(logger, "subscription.opened", authorize_url=authorize_url)
+        return Response(
+            self._stream_token_events(subscription),
+            mimetype="text/event-stream",
+            headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+        )
+
+    def _stream_token_events(self, subscription: TokenSubscription) -> Iterator[str]:
+        """
+        Server-Sent Events: a `token` event per coalesced notification, `removed` instead when the token was
+        invalidated, a `resync` event when notifications were dropped (consumers should then re-read the tokens
+        they use) and comments as keepalives, which also detect disconnected clients.
+        """
+        try:
+            yield "retry: 3000\n\n"
+            while not subscription.closed:
+                batch = subscription.next_batch(timeout=self.config.subscription_keepalive)
+                if batch is None:
+                    yield ": keepalive\n\n"
+                    continue
+                if batch["overflowed"]:
+                    yield "event: resync\ndata: {}\n\n"
+                yield "".join(
+                    f"id: {notification['id']}\nevent: {'removed' if notification['removed'] else 'token'}\n"
+                    f"data: {json.dumps(notification)}\n\n"
+                    for notification in batch["notifications"]
+                )
+        finally:
+            self.token_events.unsubscribe(subscription)
+            log_event(logger, "subscription.closed", authorize_url=subscription.authorize_url)
+
+    def handle_forward(self, name: str, path: str) -> Any:
+        """
+        Forwards the request to the upstream of the `name` route with its bearer token, see `Oauth2ForwardProxy`.
+        The request body is buffered, to be sent again if the upstream rejects the token.
+        """
+        route = self.forwarder.get_route(name) if self.forwarder else None
+        if not route:
+            return Response(f"Unknown forward route '{name}'.", status=404)
+
+        try:
+            upstream = self.forwarder.forward(
+                route,
+                method=request.method,
+                path=path,
+                query_string=request.query_string,
+                headers=request.headers.items(),
+                body=request.get_data()
+            )
+        except (AdmissionRejected, FlowFailedRecently) as e:
+            return self._token_refused_response(e, route.authorize_url)
+        except Exception as e:
+            log_event(logger, "forward.failed", logging.WARNING, route=name, error=str(e))
+            return Response(f"Forwarding to '{name}' failed: {e}", status=502)
+
+        response = Response(
+            self.forwarder.response_body(upstream),
+            status=upstream.status_code,
+            headers=Oauth2ForwardProxy.response_headers(upstream),
+            direct_passthrough=True
+        )
+        response.call_on_close(upstream.close)
+        return response
+
+    def handle_debug_profile(self) -> Any:
+        """
+        Samples the stacks of all threads for `seconds` and returns them as collapsed stacks
+        (e.g. `curl .../proxy/debug/profile?seconds=30 | flamegraph.pl > profile.svg`).
+        """
+        profile_request = self._parse_debug_request()
+        if isinstance(profile_request, Response):
+            return profile_request
+
+        log_event(logger, "debug.profile", seconds=profile_request.seconds)
+        try:
+            stacks = self.profiler.capture(profile_request.seconds)
+        except ProfilerBusy as e:
+            return Response(str(e), status=409)
+        return Response(SamplingProfiler.format_collapsed(stacks), mimetype="text/plain")
+
+    def handle_debug_heap(self) -> Any:
+        """
+        Returns the source lines (tracebacks of `frames` frames) whose allocations grew the most during `seconds`.
+        """
+        profile_request = self._parse_debug_request()
+        if isinstance(profile_request, Response):
+            return profile_request
+
+        log_event(logger, "debug.heap", seconds=profile_request.seconds)
+        try:
+            lines = self.profiler.capture_heap(profile_request.seconds, profile_request.limit, profile_request.frames)
+        except ProfilerBusy as e:
+            return Response(str(e), status=409)
+        return Response("\n".join(lines) + "\n", mimetype="text/plain")
+
+    def _parse_debug_request(self) -> Any:
+        if not self.config.debug_endpoints:
+            return Response("Debug endpoints are disabled.", status=404)
+        if not self._is_loopback_request():
+            return Response("Debug endpoints are only available from the loopback interface.", status=403)
+        try:
+            return LocalProxyProfileRequest(**request.args.to_dict())
+        except ValidationError as ve:
+            return Response(f"Invalid request: {ve}", status=400)
 
     def _autoconfigure_system(self, callback_url: Url) -> None:
         # DNS auto configuration
         try:
             self.system.dns_resolver.add_mapping(("127.0.0.1", callback_url.hostname()))
 
-            # ip forwarding auto configuration
+            # ip forwarding auto configuration, only needed when no listener is bound on the callback port
             src_port, dst_port = callback_url.port(), self.config.port
-            if src_port != dst_port:
+            if src_port not in self.listening_ports():
                 self.system.networking.configure_ip_forwarding(src_port, dst_port)
         except Exception as e:
             raise SystemError(f"system error occurred: {e}")
-            
+
+    def listening_ports(self) -> Set[int]:
+        return {server.port for server in self._servers} or {self.config.port}
+
+    def _create_servers(self) -> List[BaseWSGIServer]:
+        """
+        Creates one threaded WSGI server per listener, all of them serving the same Flask app:
+        the proxy port first, then the extra callback ports and the systemd pre-opened sockets.
+        """
+        servers = [make_server("0.0.0.0", self.config.port, self.app, threaded=True)]
+        for port in self.config.callback_ports:
+            if port != self.config.port:
+                servers.append(make_server("0.0.0.0", port, self.app, threaded=True))
+        if self.config.systemd_sockets:
+            for fd in SystemdSockets.listen_fds():
+                servers.append(make_server(SystemdSockets.bind_host(fd), 0, self.app, threaded=True, fd=fd))
+        return servers
+
+    def stop(self) -> None:
+        """
+        Stops the servers of a started proxy, `start` then returns.
+        """
+        for server in self._servers:
+            server.shutdown()
+
     def start(self):
-        print(f"Listening on http://0.0.0.0:{self.config.port}")
-        self.app.run(host="0.0.0.0", port=self.config.port)
+        warmup = None
+        if self.config.warmup_manifest:
+            warmup = Oauth2LocalProxyWarmup(
+                identity_provider_registry=self.identity_provider_registry,
+                acquire_token=self.acquire_token,
+                manifest=LocalProxyWarmupManifest.from_file(self.config.warmup_manifest)
+            )
+
+        self._servers = self._create_servers()
+        for server in self._servers[1:]:
+            log_event(logger, "proxy.listening", host=server.host, port=server.port, role="callback")
+            threading.Thread(target=server.serve_forever, daemon=True).start()
+
+        if warmup:
+            # flows need the listeners up to receive their callbacks
+            threading.Thread(target=warmup.run, daemon=True).start()
+
+        log_event(logger, "proxy.listening", host=self._servers[0].host, port=self.config.port, role="proxy")
+        try:
+            self._servers[0].serve_forever()
+        finally:
+            self.exchange_pipeline.shutdown()
+            if self.forwarder:
+                self.forwarder.close()
+            if self.capture:
+                self.capture.close()
+            for server in self._servers:
+                server.server_close()
@@ -1,7 +1,7 @@
-from dataclasses import dataclass
-from typing import Optional
+from dataclasses import dataclass, field
+from typing import List, Optional
 
-from pydantic import BaseModel, HttpUrl
+from pydantic import BaseModel, Field, HttpUrl, PositiveInt
 
 from edenredtools.net.url import Url
 
@@ -12,12 +12,84 @@ class Oauth2LocalProxyConfig:
     authorize_flow_timeout: int
     autoconfigure_system: bool
     fingerprint_secret: str
+    callback_ports: List[int] = field(default_factory=list)
+    systemd_sockets: bool = False
+    coalesce_browser_launches: bool = False
+    browser_launch_interval: float = 10.0
+    warmup_manifest: Optional[str] = None
+    max_waiters_per_flow: Optional[int] = None
+    max_waiters_total: Optional[int] = None
+    admission_retry_after: int = 5
+    exchange_workers: int = 4
+    max_token_subscribers: int = 64
+    subscriber_buffer_size: int = 16
+    subscription_keepalive: float = 15.0
+    debug_endpoints: bool = False
+    forward_routes: Optional[str] = None
+    forward_read_timeout: float = 60.0
+    capture_file: Optional[str] = None
 
 
 class LocalProxyTokenRequest(BaseModel):
     authorize_url: HttpUrl
     callback_url: HttpUrl
     client_secret: Optional[str] = None
-    
-    
-    
\ No newline at end of file
+
+
+class LocalProxyUserInfoRequest(LocalProxyTokenRequest):
+    userinfo: bool = True
+
+
+class LocalProxyValidateRequest(BaseModel):
+    token: str
+    authorize_url: HttpUrl
+    audience: Optional[str] = None
+
+
+class LocalProxyResetRequest(BaseModel):
+    authorize_url: Optional[HttpUrl] = None
+
+
+class LocalProxySubscribeRequest(BaseModel):
+    authorize_url: Optional[HttpUrl] = None
+
+
+class LocalProxyProfileRequest(BaseModel):
+    seconds: float = Field(default=10.0, gt=0, le=300)
+    limit: PositiveInt = 50
+    frames: PositiveInt = 1
+
+
+class LocalProxyForwardRoute(BaseModel):
+    name: str = Field(pattern=r"^[A-Za-z0-9_.-]+$")
+    upstream: HttpUrl
+    authorize_url: HttpUrl
+    callback_url: HttpUrl
+    client_secret: Optional[str] = None
+
+    def token_request(self) -> LocalProxyTokenRequest:
+        return LocalProxyTokenRequest(
+            authorize_url=self.authorize_url,
+            callback_url=self.callback_url,
+            client_secret=self.client_secret
+        )
+
+
+class LocalProxyForwardRoutes(BaseModel):
+    routes: List[LocalProxyForwardRoute]
+
+    @classmethod
+    def from_file(cls, path: str) -> "LocalProxyForwardRoutes":
+        with open(path) as f:
+            return cls.model_validate_json(f.read())
+
+
+class LocalProxyWarmupManifest(BaseModel):
+    flows: List[LocalProxyTokenRequest]
+    run_flows: bool = False
+    concurrency: PositiveInt = 4
+
+    @classmethod
+    def from_file(cls, path: str) -> "LocalProxyWarmupManifest":
+        with open(path) as f:
+            return cls.model_validate_json(f.read())
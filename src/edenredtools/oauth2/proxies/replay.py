@@ -0,0 +1,305 @@
+from collections import Counter, defaultdict, deque
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime as dt
+import datetime
+import json
+import math
+import secrets
+import socket
+import threading
+import time
+import urllib.parse
+from typing import Any, Deque, Dict, List, Optional
+
+from flask import Flask, g
+import requests
+from werkzeug.serving import make_server
+
+from edenredtools.oauth2.flows.registry import ThreadSafeAuthorizationFlowRegistry
+from edenredtools.oauth2.identity_provider import ThreadSafeIdentityProviderRegistry
+from edenredtools.oauth2.proxies.capture import CAPTURE_FORMAT_VERSION
+from edenredtools.oauth2.proxies.local import FlaskOauth2LocalProxy
+from edenredtools.oauth2.proxies.models import Oauth2LocalProxyConfig
+from edenredtools.oauth2.tokens.registry import ThreadSafeOauth2TokenRegistry
+from edenredtools.security.crypto import CryptoUtils
+
+_REPLAY_CLIENT_PREFIX = "replay-"
+_TOKEN_SOURCE_HEADER = "X-Replay-Token-Source"
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def load_trace(path: str) -> List[Dict[str, Any]]:
+    """
+    Returns the records of a `TrafficCapture` trace, ordered by start time.
+    """
+    records = []
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            if not line.strip():
+                continue
+            record = json.loads(line)
+            if record.get("kind") == "capture":
+                if record.get("version") != CAPTURE_FORMAT_VERSION:
+                    raise ValueError(f"unsupported capture format version {record.get('version')}.")
+                continue
+            records.append(record)
+    return sorted(records, key=lambda record: record["t"])
+
+
+def percentile(sorted_values: List[float], percent: float) -> Optional[float]:
+    """
+    Nearest-rank percentile of already sorted values.
+    """
+    if not sorted_values:
+        return None
+    rank = max(1, math.ceil(percent / 100 * len(sorted_values)))
+    return sorted_values[rank - 1]
+
+
+class StubIdentityProvider:
+    """
+    Minimal OIDC provider (discovery and token endpoints) granting a fresh token of `token_ttl` seconds
+    for any code, served on an ephemeral local port.
+    """
+
+    def __init__(self, token_ttl: int = 3600) -> None:
+        self.token_ttl = token_ttl
+        self.exchanges = 0
+        self._lock = threading.Lock()
+        self.port = _free_port()
+        self.base_url = f"http://127.0.0.1:{self.port}"
+        app = Flask("stub-identity-provider")
+        app.route("/.well-known/openid-configuration", methods=["GET"])(self.handle_discovery)
+        app.route("/token", methods=["POST"])(self.handle_token)
+        self._server = make_server("127.0.0.1", self.port, app, threaded=True)
+
+    def handle_discovery(self) -> Any:
+        return {
+            "issuer": self.base_url,
+            "authorization_endpoint": f"{self.base_url}/authorize",
+            "token_endpoint": f"{self.base_url}/token",
+        }
+
+    def handle_token(self) -> Any:
+        with self._lock:
+            self.exchanges += 1
+        return {
+            "access_token": secrets.token_urlsafe(24),
+            "token_type": "Bearer",
+            "expires_in": self.token_ttl,
+            "issued_at": dt.now(datetime.timezone.utc).isoformat(),
+        }
+
+    def start(self) -> None:
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+
+    def stop(self) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+
+
+class StubBrowser:
+    """
+    Stands in for the user: "consents" after the delay recorded for the key (or `default_delay`)
+    by calling the proxy callback with a code, as the identity provider redirect would.
+    """
+
+    def __init__(self, proxy_port: int, consent_delays: Dict[str, Deque[float]], default_delay: float) -> None:
+        self.proxy_port = proxy_port
+        self.consent_delays = consent_delays
+        self.default_delay = default_delay
+        self._lock = threading.Lock()
+        self._session = requests.Session()
+
+    def open(self, url: str) -> None:
+        query = urllib.parse.parse_qs(urllib.parse.urlparse(url).query)
+        key = query["client_id"][0][len(_REPLAY_CLIENT_PREFIX):]
+        with self._lock:
+            delays = self.consent_delays.get(key)
+            delay = delays.popleft() if delays else self.default_delay
+        threading.Timer(delay, self._callback, args=(query["redirect_uri"][0], query["state"][0])).start()
+
+    def _callback(self, redirect_uri: str, state: str) -> None:
+        redirect = urllib.parse.urlparse(redirect_uri)
+        self._session.get(
+            f"http://127.0.0.1:{self.proxy_port}{redirect.path}",
+            params={"code": secrets.token_urlsafe(8), "state": state},
+            headers={"Host": redirect.netloc}
+        )
+
+
+class _StubSystem:
+    def __init__(self, browser: StubBrowser) -> None:
+        self.broswer = browser
+        self.dns_resolver = None
+        self.networking = None
+
+
+class TrafficReplay:
+    """
+    Replays the token requests of a trace against an in-process proxy backed by a `StubIdentityProvider`
+    and a `StubBrowser`, at the recorded pace divided by `speed` (0 = as fast as possible), and reports the
+    latency percentiles and the cache hit ratio. Each hashed key of the trace gets its own authorize url.
+    """
+
+    def __init__(
+        self,
+        records: List[Dict[str, Any]],
+        speed: float = 1.0,
+        concurrency: int = 32,
+        token_ttl: int = 3600,
+        consent_delay: float = 0.05,
+        flow_timeout: int = 30
+    ) -> None:
+        self.token_records = [record for record in records if record["kind"] == "token" and record.get("key")]
+        self.consent_delays = self._consent_delays(records)
+        self.speed = speed
+        self.concurrency = concurrency
+        self.consent_delay = consent_delay
+        self.identity_provider = StubIdentityProvider(token_ttl)
+        self.proxy_port = _free_port()
+        self.proxy = FlaskOauth2LocalProxy(
+            _StubSystem(StubBrowser(self.proxy_port, self.consent_delays, consent_delay)),
+            ThreadSafeOauth2TokenRegistry(),
+            ThreadSafeAuthorizationFlowRegistry(),
+            ThreadSafeIdentityProviderRegistry(),
+            Oauth2LocalProxyConfig(
+                port=self.proxy_port,
+                authorize_flow_timeout=flow_timeout,
+                autoconfigure_system=False,
+                fingerprint_secret=CryptoUtils.generate_secret_key()
+            )
+        )
+        self.proxy.app.after_request(self._expose_token_source)
+
+    @staticmethod
+    def _consent_delays(records: List[Dict[str, Any]]) -> Dict[str, Deque[float]]:
+        # delay between the last token request of a key and its callback, i.e. the time the user took to consent
+        last_request: Dict[str, float] = {}
+        delays: Dict[str, Deque[float]] = defaultdict(deque)
+        for record in records:
+            key = record.get("key")
+            if not key:
+                continue
+            if record["kind"] == "token" and record.get("source") == "flow":
+                last_request[key] = record["t"]
+            elif record["kind"] == "callback" and key in last_request:
+                delays[key].append(max(0.0, record["t"] - last_request.pop(key)))
+        return delays
+
+    @staticmethod
+    def _expose_token_source(response: Any) -> Any:
+        if g.get("token_source"):
+            response.headers[_TOKEN_SOURCE_HEADER] = g.token_source
+        return response
+
+    def token_request(self, record: Dict[str, Any]) -> Dict[str, str]:
+        callback_url = f"http://localhost:{self.proxy_port}/callback/{record.get('callback') or 'default'}"
+        authorize_url = f"{self.identity_provider.base_url}/authorize?" + urllib.parse.urlencode({
+            "client_id": _REPLAY_CLIENT_PREFIX + record["key"],
+            "scope": "openid",
+            "redirect_uri": callback_url,
+            "response_type": "code",
+            "code_challenge_method": "S256",
+        })
+        return {"authorize_url": authorize_url, "callback_url": callback_url}
+
+    def run(self) -> Dict[str, Any]:
+        self.identity_provider.start()
+        threading.Thread(target=self.proxy.start, daemon=True).start()
+        session = requests.Session()
+        session.mount("http://", requests.adapters.HTTPAdapter(pool_maxsize=self.concurrency))
+        self._wait_for_proxy(session)
+
+        results: List[Dict[str, Any]] = []
+        lock = threading.Lock()
+
+        def send(record: Dict[str, Any], due: float) -> None:
+            started_at = time.monotonic()
+            try:
+                response = session.post(f"http://127.0.0.1:{self.proxy_port}/proxy/token", data=self.token_request(record))
+                status, source = response.status_code, response.headers.get(_TOKEN_SOURCE_HEADER)
+                served = self._is_token(response)
+            except requests.RequestException:
+                status, source, served = None, None, False
+            result = {
+                "latency": time.monotonic() - started_at,
+                "lag": started_at - due,
+                "status": status,
+                "source": source,
+                "served": served,
+            }
+            with lock:
+                results.append(result)
+
+        # the trace starts with its first token request, not with the capture
+        trace_started_at = self.token_records[0]["t"] if self.token_records else 0.0
+        replay_started_at = time.monotonic()
+        try:
+            with ThreadPoolExecutor(max_workers=self.concurrency) as executor:
+                for record in self.token_records:
+                    offset = (record["t"] - trace_started_at) / self.speed if self.speed > 0 else 0.0
+                    due = replay_started_at + offset
+                    delay = due - time.monotonic()
+                    if delay > 0:
+                        time.sleep(delay)
+                    executor.submit(send, record, due)
+        finally:
+            duration = time.monotonic() - replay_started_at
+            self.proxy.stop()
+            self.identity_provider.stop()
+        return self.report(results, duration)
+
+    @staticmethod
+    def _is_token(response: requests.Response) -> bool:
+        # some proxy errors are answered with a 200, only a token body is a success
+        if response.status_code != 200:
+            return False
+        try:
+            body = response.json()
+        except ValueError:
+            return False
+        return isinstance(body, dict) and "access_token" in body
+
+    def _wait_for_proxy(self, session: requests.Session, timeout: float = 10.0) -> None:
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            try:
+                if session.get(f"http://127.0.0.1:{self.proxy_port}/proxy/health").ok:
+                    return
+            except requests.RequestException:
+                pass
+            time.sleep(0.05)
+        raise TimeoutError(f"replay proxy did not start within {timeout} seconds.")
+
+    def report(self, results: List[Dict[str, Any]], duration: float) -> Dict[str, Any]:
+        def latency_summary(latencies: List[float]) -> Dict[str, Optional[float]]:
+            latencies = sorted(latency * 1000 for latency in latencies)
+            return {
+                f"p{percent:g}": round(value, 3) if value is not None else None
+                for percent, value in ((p, percentile(latencies, p)) for p in (50, 90, 99, 99.9, 100))
+            }
+
+        served = [result for result in results if result["served"]]
+        hits = sum(1 for result in served if result["source"] == "cache")
+        by_source: Dict[str, List[float]] = defaultdict(list)
+        for result in served:
+            by_source[result["source"] or "unknown"].append(result["latency"])
+        return {
+            "requests": len(results),
+            "duration_s": round(duration, 3),
+            "throughput_rps": round(len(results) / duration, 1) if duration else None,
+            "statuses": dict(Counter(str(result["status"]) for result in results)),
+            "served": len(served),
+            "failed": len(results) - len(served),
+            "cache_hit_ratio": round(hits / len(served), 4) if served else None,
+            "identity_provider_exchanges": self.identity_provider.exchanges,
+            "latency_ms": latency_summary([result["latency"] for result in results]),
+            "latency_ms_by_source": {source: latency_summary(values) for source, values in by_source.items()},
+            "max_schedule_lag_ms": round(max((result["lag"] for result in results), default=0.0) * 1000, 3),
+        }
@@ -0,0 +1,63 @@
+from concurrent.futures import ThreadPoolExecutor
+import logging
+from typing import Callable, Dict
+
+from edenredtools.net.url import Url
+from edenredtools.oauth2.flows.factory import Oauth2AuthorizationFlowFactory
+from edenredtools.oauth2.identity_provider import IdentityProviderRegistry
+from edenredtools.oauth2.proxies.models import LocalProxyTokenRequest, LocalProxyWarmupManifest
+from edenredtools.system.logs import log_event
+
+logger = logging.getLogger(__name__)
+
+
+class Oauth2LocalProxyWarmup:
+    """
+    Warms the proxy up from a manifest of token requests: fetches the discovery document of every
+    issuer (which also opens the issuer connection pool) and, if requested, runs the authorization
+    flows with bounded concurrency so that the token registry is populated before the first request.
+    """
+
+    def __init__(
+        self,
+        identity_provider_registry: IdentityProviderRegistry,
+        acquire_token: Callable[[LocalProxyTokenRequest], dict],
+        manifest: LocalProxyWarmupManifest
+    ) -> None:
+        self.identity_provider_registry = identity_provider_registry
+        self.acquire_token = acquire_token
+        self.manifest = manifest
+
+    def run(self) -> None:
+        self.prefetch_discovery()
+        if self.manifest.run_flows:
+            self.run_flows()
+
+    def prefetch_discovery(self) -> None:
+        issuers: Dict[Url, None] = {}
+        for token_request in self.manifest.flows:
+            authorize_url = Oauth2AuthorizationFlowFactory.create_authorize_url(token_request.authorize_url)
+            issuers.setdefault(authorize_url.base_url(), None)
+
+        with ThreadPoolExecutor(max_workers=self.manifest.concurrency) as executor:
+            for base_url, result in zip(issuers, executor.map(self._prefetch_issuer, issuers)):
+                log_event(logger, "warmup.discovery", issuer=base_url, result=result)
+
+    def run_flows(self) -> None:
+        with ThreadPoolExecutor(max_workers=self.manifest.concurrency) as executor:
+            for token_request, result in zip(self.manifest.flows, executor.map(self._run_flow, self.manifest.flows)):
+                log_event(logger, "warmup.token", authorize_url=token_request.authorize_url, result=result)
+
+    def _prefetch_issuer(self, base_url: Url) -> str:
+        try:
+            self.identity_provider_registry.get_or_create(base_url)
+            return "ok"
+        except Exception as e:
+            return f"failed ({e})"
+
+    def _run_flow(self, token_request: LocalProxyTokenRequest) -> str:
+        try:
+            self.acquire_token(token_request)
+            return "ok"
+        except Exception as e:
+            return f"failed ({e})"
@@ -0,0 +1,118 @@
+from collections import OrderedDict
+import hashlib
+import threading
+from typing import Any, Dict, List, Optional
+
+from edenredtools.net.url import Url
+from edenredtools.oauth2.tokens.registry import Oauth2TokenRegistryListener
+from edenredtools.oauth2.tokens.validator import TokenValidator
+
+
+class TooManySubscribers(Exception):
+    pass
+
+
+class TokenSubscription:
+    """
+    Notifications of a single subscriber, optionally filtered on one authorize url. Pending notifications
+    are coalesced per authorize url (a burst of sets is delivered as its last one) and bounded by
+    `max_pending`: on overflow the oldest ones are dropped and the subscriber is told to resync.
+    """
+
+    def __init__(self, authorize_url: Optional[Url], max_pending: int) -> None:
+        self.authorize_url = authorize_url
+        self.max_pending = max_pending
+        self._lock = threading.Condition()
+        self._pending: "OrderedDict[Url, Dict[str, Any]]" = OrderedDict()
+        self._overflowed = False
+        self._closed = False
+
+    def matches(self, authorize_url: Url) -> bool:
+        return self.authorize_url is None or self.authorize_url == authorize_url
+
+    def push(self, authorize_url: Url, notification: Dict[str, Any]) -> None:
+        with self._lock:
+            self._pending.pop(authorize_url, None)
+            self._pending[authorize_url] = notification
+            while len(self._pending) > self.max_pending:
+                self._pending.popitem(last=False)
+                self._overflowed = True
+            self._lock.notify()
+
+    def next_batch(self, timeout: float) -> Optional[Dict[str, Any]]:
+        """
+        Waits up to `timeout` seconds for notifications, returns None on timeout or once closed,
+        otherwise {"notifications": [...], "overflowed": bool}.
+        """
+        with self._lock:
+            if not self._lock.wait_for(lambda: self._pending or self._overflowed or self._closed, timeout):
+                return None
+            if self._closed:
+                return None
+            batch = {"notifications": list(self._pending.values()), "overflowed": self._overflowed}
+            self._pending.clear()
+            self._overflowed = False
+            return batch
+
+    @property
+    def closed(self) -> bool:
+        return self._closed
+
+    def close(self) -> None:
+        with self._lock:
+            self._closed = True
+            self._lock.notify_all()
+
+
+class TokenEventBroker(Oauth2TokenRegistryListener):
+    """
+    Fans out token registry sets to subscribers. Notifications carry the authorize url, the expiration
+    and a fingerprint of the new token, never the token itself: subscribers fetch it from `/proxy/token`,
+    where it is a cache hit.
+    """
+
+    def __init__(self, max_subscribers: int = 64, max_pending: int = 16) -> None:
+        self.max_subscribers = max_subscribers
+        self.max_pending = max_pending
+        self._lock = threading.Lock()
+        self._subscriptions: List[TokenSubscription] = []
+        self._sequence = 0
+
+    def subscribe(self, authorize_url: Optional[Url] = None) -> TokenSubscription:
+        with self._lock:
+            if len(self._subscriptions) >= self.max_subscribers:
+                raise TooManySubscribers(f"Too many token subscribers ({len(self._subscriptions)}), retry later.")
+            subscription = TokenSubscription(authorize_url, self.max_pending)
+            self._subscriptions.append(subscription)
+            return subscription
+
+    def unsubscribe(self, subscription: TokenSubscription) -> None:
+        subscription.close()
+        with self._lock:
+            if subscription in self._subscriptions:
+                self._subscriptions.remove(subscription)
+
+    def on_token_set(self, authorize_url: Url, token_data: dict) -> None:
+        self._publish(authorize_url, token_data, removed=False)
+
+    def on_token_removed(self, authorize_url: Url, token_data: dict) -> None:
+        self._publish(authorize_url, token_data, removed=True)
+
+    def _publish(self, authorize_url: Url, token_data: dict, removed: bool) -> None:
+        with self._lock:
+            subscriptions = [s for s in self._subscriptions if s.matches(authorize_url)]
+            if not subscriptions:
+                return
+            self._sequence += 1
+            sequence = self._sequence
+
+        expiration = None if removed else TokenValidator.expires_at(token_data)
+        notification = {
+            "id": sequence,
+            "authorize_url": authorize_url.to_string(),
+            "removed": removed,
+            "expires_at": expiration.isoformat() if expiration else None,
+            "fingerprint": hashlib.sha256(str(token_data.get("access_token", "")).encode("utf-8")).hexdigest()[:16],
+        }
+        for subscription in subscriptions:
+            subscription.push(authorize_url, notification)
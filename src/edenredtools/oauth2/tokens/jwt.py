@@ -0,0 +1,250 @@
+import base64
+from collections import OrderedDict
+from dataclasses import dataclass
+import hashlib
+import hmac
+import json
+import threading
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+from edenredtools.net.resilience import ResilientHttpClient
+
+
+class JwtValidationError(ValueError):
+    pass
+
+
+def _b64url_decode(segment: str) -> bytes:
+    return base64.urlsafe_b64decode(segment + "=" * (-len(segment) % 4))
+
+
+def _b64url_uint(segment: str) -> int:
+    return int.from_bytes(_b64url_decode(segment), "big")
+
+
+def decode_unverified(token: str) -> Tuple[Dict[str, Any], Dict[str, Any], bytes, bytes]:
+    """
+    Splits a compact JWS into its header, claims, signing input and signature, without verifying anything.
+    """
+    try:
+        header_segment, claims_segment, signature_segment = token.split(".")
+        header = json.loads(_b64url_decode(header_segment))
+        claims = json.loads(_b64url_decode(claims_segment))
+        signature = _b64url_decode(signature_segment)
+    except (ValueError, TypeError) as e:
+        raise JwtValidationError(f"malformed token: {e}")
+    if not isinstance(header, dict) or not isinstance(claims, dict):
+        raise JwtValidationError("malformed token: header and claims must be JSON objects.")
+    return header, claims, f"{header_segment}.{claims_segment}".encode("ascii"), signature
+
+
+@dataclass(frozen=True)
+class RsaPublicKey:
+    """
+    RSA public key verifying RSASSA-PKCS1-v1_5 signatures (JWS RS256, RS384 and RS512).
+    """
+    # DER encoded DigestInfo prefixes, RFC 8017 section 9.2
+    _DIGEST_INFO = {
+        "RS256": (hashlib.sha256, bytes.fromhex("3031300d060960864801650304020105000420")),
+        "RS384": (hashlib.sha384, bytes.fromhex("3041300d060960864801650304020205000430")),
+        "RS512": (hashlib.sha512, bytes.fromhex("3051300d060960864801650304020305000440")),
+    }
+
+    n: int
+    e: int
+
+    @classmethod
+    def supported_algorithms(cls) -> List[str]:
+        return list(cls._DIGEST_INFO)
+
+    @classmethod
+    def from_jwk(cls, jwk: Dict[str, Any]) -> "RsaPublicKey":
+        return cls(n=_b64url_uint(jwk["n"]), e=_b64url_uint(jwk["e"]))
+
+    def verify(self, algorithm: str, signing_input: bytes, signature: bytes) -> bool:
+        if algorithm not in self._DIGEST_INFO:
+            return False
+        digest, digest_info = self._DIGEST_INFO[algorithm]
+        size = (self.n.bit_length() + 7) // 8
+        if len(signature) != size:
+            return False
+        signature_int = int.from_bytes(signature, "big")
+        if signature_int >= self.n:
+            return False
+
+        encoded = pow(signature_int, self.e, self.n).to_bytes(size, "big")
+        suffix = digest_info + digest(signing_input).digest()
+        padding = size - len(suffix) - 3
+        if padding < 8:
+            return False
+        expected = b"\x00\x01" + b"\xff" * padding + b"\x00" + suffix
+        return hmac.compare_digest(encoded, expected)
+
+
+class JwksCache:
+    """
+    Caches the parsed keys of a JWKS endpoint for `ttl` seconds. A key id missing from the cache
+    triggers a refresh, to follow key rotations, at most once every `min_refresh_interval` seconds,
+    whether the previous attempt succeeded or not. A single caller fetches, outside of the lock:
+    concurrent callers keep using the cached keys, or wait for the fetch when they have none to use.
+    """
+
+    def __init__(
+        self,
+        http_client: ResilientHttpClient,
+        jwks_url: str,
+        ttl: float = 3600.0,
+        min_refresh_interval: float = 30.0
+    ) -> None:
+        self.http_client = http_client
+        self.jwks_url = jwks_url
+        self.ttl = ttl
+        self.min_refresh_interval = min_refresh_interval
+        self._lock = threading.Condition()
+        self._keys: Dict[Optional[str], RsaPublicKey] = {}
+        self._fetched_at = float("-inf")
+        self._attempted_at = float("-inf")
+        self._refreshing = False
+
+    def get_key(self, kid: Optional[str]) -> RsaPublicKey:
+        refresh = False
+        with self._lock:
+            while True:
+                now = time.monotonic()
+                stale = now - self._fetched_at >= self.ttl or kid not in self._keys
+                if not stale or now - self._attempted_at < self.min_refresh_interval:
+                    break
+                if not self._refreshing:
+                    self._refreshing = refresh = True
+                    break
+                if kid in self._keys:
+                    # expired but still usable while another caller refreshes
+                    break
+                self._lock.wait()
+
+        if refresh:
+            try:
+                self._refresh()
+            except Exception:
+                # keys past their ttl are better than none while the IdP is unreachable
+                if kid not in self._keys:
+                    raise
+
+        key = self._keys.get(kid)
+        if not key:
+            raise JwtValidationError(f"no signing key found for kid '{kid}'.")
+        return key
+
+    def _refresh(self) -> None:
+        try:
+            keys = self._fetch()
+        except BaseException:
+            with self._lock:
+                # failed attempts are rate limited too, an IdP outage does not turn into a fetch per token
+                self._attempted_at = time.monotonic()
+                self._refreshing = False
+                self._lock.notify_all()
+            raise
+        with self._lock:
+            self._keys = keys
+            self._fetched_at = self._attempted_at = time.monotonic()
+            self._refreshing = False
+            self._lock.notify_all()
+
+    def _fetch(self) -> Dict[Optional[str], RsaPublicKey]:
+        response = self.http_client.get(self.jwks_url)
+        response.raise_for_status()
+        keys: Dict[Optional[str], RsaPublicKey] = {}
+        for jwk in response.json().get("keys", []):
+            if jwk.get("kty") != "RSA" or jwk.get("use", "sig") != "sig":
+                continue
+            try:
+                keys[jwk.get("kid")] = RsaPublicKey.from_jwk(jwk)
+            except (KeyError, ValueError, TypeError):
+                continue
+        # tokens without kid can only be matched when the set holds a single key
+        if len(keys) == 1:
+            keys[None] = next(iter(keys.values()))
+        return keys
+
+
+class JwtValidator:
+    """
+    Validates JWTs (access and id tokens) locally: signature against the cached JWKS of the issuer,
+    then `iss`, `exp` (required unless `require_exp` is False), `nbf` and, if requested, `aud` claims.
+    The claims of the last `cache_size` tokens whose signature was verified are kept, so that validating
+    them again skips the RSA operation.
+    """
+
+    def __init__(
+        self,
+        jwks: JwksCache,
+        issuer: Optional[str] = None,
+        leeway: int = 30,
+        cache_size: int = 1024,
+        require_exp: bool = True
+    ) -> None:
+        self.jwks = jwks
+        self.issuer = issuer
+        self.leeway = leeway
+        self.require_exp = require_exp
+        self.cache_size = cache_size
+        self._lock = threading.Lock()
+        self._verified: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+
+    def validate(self, token: str, audience: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Returns the claims of the token, raising `JwtValidationError` if it is not valid.
+        """
+        with self._lock:
+            claims = self._verified.get(token)
+            if claims is not None:
+                self._verified.move_to_end(token)
+
+        if claims is None:
+            claims = self._verify_signature(token)
+            with self._lock:
+                self._verified[token] = claims
+                if len(self._verified) > self.cache_size:
+                    self._verified.popitem(last=False)
+
+        return self._validate_claims(claims, audience)
+
+    def _verify_signature(self, token: str) -> Dict[str, Any]:
+        header, claims, signing_input, signature = decode_unverified(token)
+        algorithm = header.get("alg")
+        if algorithm not in RsaPublicKey.supported_algorithms():
+            raise JwtValidationError(f"unsupported algorithm '{algorithm}'.")
+
+        key = self.jwks.get_key(header.get("kid"))
+        if not key.verify(algorithm, signing_input, signature):
+            raise JwtValidationError("invalid signature.")
+        return claims
+
+    def _validate_claims(self, claims: Dict[str, Any], audience: Optional[str]) -> Dict[str, Any]:
+        if self.issuer and claims.get("iss") != self.issuer:
+            raise JwtValidationError(f"unexpected issuer '{claims.get('iss')}'.")
+
+        try:
+            expires_at = float(claims["exp"]) if "exp" in claims else None
+            not_before = float(claims["nbf"]) if "nbf" in claims else None
+        except (TypeError, ValueError):
+            raise JwtValidationError("malformed time claims.")
+
+        if expires_at is None and self.require_exp:
+            raise JwtValidationError("token has no exp claim.")
+
+        now = time.time()
+        if expires_at is not None and now - self.leeway >= expires_at:
+            raise JwtValidationError("token is expired.")
+        if not_before is not None and now + self.leeway < not_before:
+            raise JwtValidationError("token is not valid yet.")
+
+        if audience:
+            token_audience = claims.get("aud")
+            audiences = token_audience if isinstance(token_audience, list) else [token_audience]
+            if audience not in audiences:
+                raise JwtValidationError(f"token is not intended for audience '{audience}'.")
+
+        return claims
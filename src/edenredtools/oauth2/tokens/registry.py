@@ -1,9 +1,22 @@
 from abc import ABC, abstractmethod
+import logging
 import threading
-from typing import Dict, Optional
+from typing import Callable, Collection, Dict, FrozenSet, List, Optional, Tuple
 
+from edenredtools.oauth2.flows.factory import Oauth2AuthorizationFlowFactory
 from edenredtools.oauth2.tokens.validator import TokenValidator
 from edenredtools.net.url import Url
+from edenredtools.system.logs import log_event
+
+logger = logging.getLogger(__name__)
+
+
+class Oauth2TokenRegistryListener(ABC):
+    @abstractmethod
+    def on_token_set(self, authorize_url: Url, token_data: dict) -> None: ...
+
+    @abstractmethod
+    def on_token_removed(self, authorize_url: Url, token_data: dict) -> None: ...
 
 
 class Oauth2TokenRegistry(ABC):
@@ -16,11 +29,36 @@ class Oauth2TokenRegistry(ABC):
     @abstractmethod
     def read_valid_token(self, authorize_url: Url, buffer_seconds: int=10) -> Optional[dict]: ...
 
+    @abstractmethod
+    def invalidate(self, token_data: dict) -> int: ...
+
+    @abstractmethod
+    def add_listener(self, listener: Oauth2TokenRegistryListener) -> None: ...
+
 
 class ThreadSafeOauth2TokenRegistry(Oauth2TokenRegistry):
-    def __init__(self) -> None:
+    ALL_CLIENTS = "*"
+
+    def __init__(
+        self,
+        listeners: Optional[List[Oauth2TokenRegistryListener]] = None,
+        scope_superset_clients: Optional[Collection[str]] = None
+    ) -> None:
+        """
+        :param listeners: Listeners notified of every token set.
+        :param scope_superset_clients: Client ids (or `*` for all of them) for which a token granted for a
+            superset of the requested scopes, with the same client_id, redirect_uri and response_type, is reused.
+        """
         self._lock = threading.Lock()
         self._store: Dict[Url, dict] = {}
+        self._listeners: List[Oauth2TokenRegistryListener] = list(listeners or [])
+        self._scope_superset_clients = frozenset(scope_superset_clients or ())
+        # scope group key -> authorize url -> scopes granted to its token
+        self._scope_index: Dict[Url, Dict[Url, FrozenSet[str]]] = {}
+        # listeners are notified outside of `_lock`, one key at a time and in the order of its changes
+        self._sequence = 0
+        self._notify_locks: Dict[Url, threading.Lock] = {}
+        self._notified_sequences: Dict[Url, int] = {}
 
     def get(self, authorize_url: Url):
         with self._lock:
@@ -29,11 +67,98 @@ class ThreadSafeOauth2TokenRegistry(Oauth2TokenRegistry):
     def set(self, authorize_url: Url, token_data: dict):
         with self._lock:
             self._store[authorize_url] = token_data
+            if self._scope_superset_clients:
+                self._index_scopes(authorize_url, token_data)
+            sequence, listeners = self._prepare_notification()
+        self._notify(
+            authorize_url, sequence, listeners, lambda listener: listener.on_token_set(authorize_url, token_data)
+        )
+
+    def _prepare_notification(self) -> Tuple[int, List[Oauth2TokenRegistryListener]]:
+        # called under `_lock`, sequences follow the order of the changes
+        self._sequence += 1
+        return self._sequence, list(self._listeners)
+
+    def _notify(
+        self,
+        authorize_url: Url,
+        sequence: int,
+        listeners: List[Oauth2TokenRegistryListener],
+        notify: Callable[[Oauth2TokenRegistryListener], None]
+    ) -> None:
+        """
+        Notifies the listeners (which may write files) without holding `_lock`, so that reads never wait on them.
+        The notifications of a key are delivered one at a time, and one overtaken by a later change of its key
+        that was already delivered is dropped: listeners always end up with the last change.
+        """
+        with self._lock:
+            notify_lock = self._notify_locks.setdefault(authorize_url, threading.Lock())
+        with notify_lock:
+            if sequence < self._notified_sequences.get(authorize_url, 0):
+                return
+            self._notified_sequences[authorize_url] = sequence
+            for listener in listeners:
+                try:
+                    notify(listener)
+                except Exception as e:
+                    log_event(
+                        logger, "token.listener_failed", logging.WARNING,
+                        listener=type(listener).__name__, authorize_url=authorize_url, error=str(e)
+                    )
+
+    def invalidate(self, token_data: dict) -> int:
+        """
+        Forgets a token rejected by its audience. Only the entries still holding this very token are removed,
+        a token stored meanwhile by a concurrent flow is kept. Returns the number of entries removed.
+        """
+        with self._lock:
+            stale = [url for url, stored in self._store.items() if stored is token_data]
+            for authorize_url in stale:
+                del self._store[authorize_url]
+                group = self._scope_index.get(Oauth2AuthorizationFlowFactory.create_scope_group_key(authorize_url))
+                if group:
+                    group.pop(authorize_url, None)
+            if not stale:
+                return 0
+            sequence, listeners = self._prepare_notification()
+
+        for authorize_url in stale:
+            self._notify(
+                authorize_url, sequence, listeners,
+                lambda listener: listener.on_token_removed(authorize_url, token_data)
+            )
+        return len(stale)
+
+    def add_listener(self, listener: Oauth2TokenRegistryListener) -> None:
+        with self._lock:
+            self._listeners.append(listener)
 
     def read_valid_token(self, authorize_url: Url, buffer_seconds: int=10) -> Optional[dict]:
         token = self.get(authorize_url)
-        if not token:
-            return None
-        if not TokenValidator.is_valid(token, buffer_seconds):
-            return None
-        return token 
\ No newline at end of file
+        if token and TokenValidator.is_valid(token, buffer_seconds):
+            return token
+        if self._scope_superset_enabled(authorize_url):
+            return self._read_valid_superset_token(authorize_url, buffer_seconds)
+        return None
+
+    def _scope_superset_enabled(self, authorize_url: Url) -> bool:
+        if self.ALL_CLIENTS in self._scope_superset_clients:
+            return True
+        client_id = authorize_url.get_param("client_id")
+        return bool(client_id) and client_id[0] in self._scope_superset_clients
+
+    def _index_scopes(self, authorize_url: Url, token_data: dict) -> None:
+        # the scopes actually granted, when the IdP reports them, otherwise the requested ones
+        granted = token_data.get("scope") or (authorize_url.get_param("scope") or [""])[0]
+        group = self._scope_index.setdefault(Oauth2AuthorizationFlowFactory.create_scope_group_key(authorize_url), {})
+        group[authorize_url] = Oauth2AuthorizationFlowFactory.parse_scopes(granted)
+
+    def _read_valid_superset_token(self, authorize_url: Url, buffer_seconds: int) -> Optional[dict]:
+        requested = Oauth2AuthorizationFlowFactory.parse_scopes((authorize_url.get_param("scope") or [""])[0])
+        with self._lock:
+            group = self._scope_index.get(Oauth2AuthorizationFlowFactory.create_scope_group_key(authorize_url), {})
+            candidates = [self._store[url] for url, scopes in group.items() if requested <= scopes]
+        for token in candidates:
+            if TokenValidator.is_valid(token, buffer_seconds):
+                return token
+        return None
\ No newline at end of file
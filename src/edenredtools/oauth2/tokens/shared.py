@@ -0,0 +1,208 @@
+import hashlib
+import json
+import mmap
+import os
+import struct
+import tempfile
+import threading
+import time
+from typing import Dict, Optional
+
+from pydantic import HttpUrl
+
+from edenredtools.net.url import Url
+from edenredtools.oauth2.flows.factory import Oauth2AuthorizationFlowFactory
+from edenredtools.oauth2.tokens.registry import Oauth2TokenRegistryListener
+from edenredtools.oauth2.tokens.validator import TokenValidator
+
+# File layout (little endian), shared by the writer and the readers:
+#   header: magic (8s) | layout version (I) | slot count (I) | slot size (I), padded to HEADER_SIZE
+#   slot:   sequence (Q) | key hash (16s) | expires at, unix time (d) | payload length (I), padded to
+#           SLOT_HEADER_SIZE, followed by the JSON encoded token.
+# Each slot is protected by a seqlock: the writer makes the sequence odd, updates the slot, then makes it
+# even again. Readers retry whenever the sequence is odd or changed while they were copying the slot.
+_MAGIC = b"EDTOKTBL"
+_LAYOUT_VERSION = 1
+_HEADER = struct.Struct("<8sIII")
+_HEADER_SIZE = 64
+_SEQUENCE = struct.Struct("<Q")
+_SLOT_HEADER = struct.Struct("<Q16sdI")
+_SLOT_FIELDS = struct.Struct("<16sdI")
+_SLOT_HEADER_SIZE = 48
+_KEY_HASH_SIZE = 16
+_MAX_READ_ATTEMPTS = 1000
+# expiry written over removed tokens, in the past: readers skip them and new keys take their slots over
+_REMOVED_EXPIRES_AT = 1.0
+
+
+def _key_hash(canonical_key: str) -> bytes:
+    return hashlib.sha256(canonical_key.encode("utf-8")).digest()[:_KEY_HASH_SIZE]
+
+
+class SharedTokenTable(Oauth2TokenRegistryListener):
+    """
+    Mirrors the token registry into a fixed-layout, memory-mapped file (ideally on a tmpfs such as /dev/shm)
+    that other local processes read through `SharedTokenTableReader`, with no lock and no syscall per lookup.
+    Slots are addressed by open addressing on the hash of the canonical authorize key; a key keeps its slot
+    for the lifetime of the table, expired slots are reused by new keys.
+    The registry notifies the table outside of its own lock: writes of different keys are serialized by the
+    table lock only, and never make registry reads wait.
+    """
+
+    def __init__(self, path: str, slots: int = 256, slot_size: int = 8192) -> None:
+        if slots <= 0:
+            raise ValueError("slots must be positive.")
+        if slot_size <= _SLOT_HEADER_SIZE:
+            raise ValueError(f"slot_size must be greater than {_SLOT_HEADER_SIZE}.")
+        self.path = path
+        self.slots = slots
+        self.slot_size = slot_size
+        self._lock = threading.Lock()
+        self._slot_by_key: Dict[bytes, int] = {}
+        self._closed = False
+        self._mmap = self._create()
+
+    def _create(self) -> mmap.mmap:
+        # built aside and renamed, readers of a previous table keep a consistent (stale) view
+        directory = os.path.dirname(os.path.abspath(self.path))
+        fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".tmp-")
+        try:
+            os.ftruncate(fd, _HEADER_SIZE + self.slots * self.slot_size)
+            table = mmap.mmap(fd, 0)
+            _HEADER.pack_into(table, 0, _MAGIC, _LAYOUT_VERSION, self.slots, self.slot_size)
+            os.replace(tmp_path, self.path)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+        finally:
+            os.close(fd)
+        return table
+
+    def on_token_set(self, authorize_url: Url, token_data: dict) -> None:
+        payload = json.dumps(token_data, separators=(",", ":")).encode("utf-8")
+        expiration = TokenValidator.expires_at(token_data)
+        key_hash = _key_hash(authorize_url.canonical_string())
+        fits = len(payload) <= self.slot_size - _SLOT_HEADER_SIZE
+
+        with self._lock:
+            # a notification may still be delivered while the proxy shuts down
+            if self._closed:
+                return
+            # tokens with no known expiry are never valid (see `TokenValidator.is_valid`), nor are they
+            # published, and the previous token of the key must not stay readable
+            if not fits or not expiration:
+                self._remove(key_hash)
+            else:
+                self._write_slot(self._find_slot(key_hash), key_hash, expiration.timestamp(), payload)
+
+        if not fits:
+            raise ValueError(f"token of {len(payload)} bytes does not fit a {self.slot_size} bytes slot.")
+
+    def on_token_removed(self, authorize_url: Url, token_data: dict) -> None:
+        key_hash = _key_hash(authorize_url.canonical_string())
+        with self._lock:
+            if not self._closed:
+                self._remove(key_hash)
+
+    def _remove(self, key_hash: bytes) -> None:
+        # called under `_lock`
+        slot = self._slot_by_key.get(key_hash)
+        if slot is None:
+            return
+        # the key keeps its slot, so that the probe sequences of other keys stay intact, marked expired:
+        # readers skip it and new keys may take it over
+        self._write_slot(slot, key_hash, _REMOVED_EXPIRES_AT, b"")
+
+    def _write_slot(self, slot: int, key_hash: bytes, expires_at: float, payload: bytes) -> None:
+        # called under `_lock`
+        offset = _HEADER_SIZE + slot * self.slot_size
+        (sequence,) = _SEQUENCE.unpack_from(self._mmap, offset)
+        _SEQUENCE.pack_into(self._mmap, offset, sequence + 1)
+        payload_offset = offset + _SLOT_HEADER_SIZE
+        self._mmap[payload_offset:payload_offset + len(payload)] = payload
+        _SLOT_FIELDS.pack_into(self._mmap, offset + _SEQUENCE.size, key_hash, expires_at, len(payload))
+        _SEQUENCE.pack_into(self._mmap, offset, sequence + 2)
+
+    def _find_slot(self, key_hash: bytes) -> int:
+        slot = self._slot_by_key.get(key_hash)
+        if slot is not None:
+            return slot
+
+        now = time.time()
+        home = int.from_bytes(key_hash[:8], "little") % self.slots
+        for probe in range(self.slots):
+            slot = (home + probe) % self.slots
+            sequence, slot_key_hash, expires_at, _ = _SLOT_HEADER.unpack_from(
+                self._mmap, _HEADER_SIZE + slot * self.slot_size
+            )
+            if sequence == 0 or expires_at < now:
+                self._slot_by_key.pop(slot_key_hash, None)
+                self._slot_by_key[key_hash] = slot
+                return slot
+        raise RuntimeError(f"shared token table is full ({self.slots} slots).")
+
+    def close(self) -> None:
+        with self._lock:
+            self._closed = True
+            self._mmap.close()
+
+
+class SharedTokenTableReader:
+    """
+    Lock-free reader of a `SharedTokenTable`, meant to be used by other local processes:
+
+        reader = SharedTokenTableReader("/dev/shm/edenredtools.tokens")
+        token = reader.lookup_authorize_url("https://idp/authorize?client_id=...&scope=...")
+
+    A table is recreated when the proxy restarts, long-lived readers should then open it again.
+    """
+
+    def __init__(self, path: str) -> None:
+        with open(path, "rb") as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, self.slots, self.slot_size = _HEADER.unpack_from(self._mmap, 0)
+        if magic != _MAGIC or version != _LAYOUT_VERSION:
+            self._mmap.close()
+            raise ValueError(f"'{path}' is not a shared token table (layout version {_LAYOUT_VERSION}).")
+
+    @staticmethod
+    def canonical_key(authorize_url: str) -> str:
+        return Oauth2AuthorizationFlowFactory.create_authorize_url(HttpUrl(authorize_url)).canonical_string()
+
+    def lookup_authorize_url(self, authorize_url: str, buffer_seconds: int = 10) -> Optional[dict]:
+        return self.lookup(self.canonical_key(authorize_url), buffer_seconds)
+
+    def lookup(self, canonical_key: str, buffer_seconds: int = 10) -> Optional[dict]:
+        """
+        Returns the token stored for the canonical authorize key if it is valid for at least `buffer_seconds`.
+        """
+        key_hash = _key_hash(canonical_key)
+        home = int.from_bytes(key_hash[:8], "little") % self.slots
+        for probe in range(self.slots):
+            slot = self._read_slot((home + probe) % self.slots)
+            if slot is None:
+                return None
+            slot_key_hash, expires_at, payload = slot
+            if slot_key_hash != key_hash:
+                continue
+            if expires_at < time.time() + buffer_seconds:
+                return None
+            return json.loads(payload)
+        return None
+
+    def _read_slot(self, slot: int):
+        offset = _HEADER_SIZE + slot * self.slot_size
+        for _ in range(_MAX_READ_ATTEMPTS):
+            sequence, key_hash, expires_at, length = _SLOT_HEADER.unpack_from(self._mmap, offset)
+            if sequence == 0:
+                return None
+            if sequence & 1:
+                continue
+            payload_offset = offset + _SLOT_HEADER_SIZE
+            payload = self._mmap[payload_offset:payload_offset + length]
+            if _SEQUENCE.unpack_from(self._mmap, offset)[0] == sequence:
+                return key_hash, expires_at, payload
+        raise TimeoutError(f"slot {slot} of the shared token table kept changing while being read.")
+
+    def close(self) -> None:
+        self._mmap.close()
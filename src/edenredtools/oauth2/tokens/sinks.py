@@ -0,0 +1,78 @@
+import hashlib
+import json
+import os
+import tempfile
+import threading
+from typing import Dict
+
+from edenredtools.net.url import Url
+from edenredtools.oauth2.tokens.registry import Oauth2TokenRegistryListener
+
+
+class TokenFileSink(Oauth2TokenRegistryListener):
+    """
+    Mirrors every token stored in the registry to files, so that local consumers can read the current
+    token without calling the proxy (e.g. `cat $DIR/<name>.access_token`). Each authorize key gets a
+    `<name>.json` file with the whole token and a `<name>.access_token` file with the bare access token,
+    and `index.json` maps the canonical authorize keys to those file names. Files are created with 0600
+    permissions and replaced atomically, readers never observe a partially written token.
+    The directory is expected to live on a tmpfs (e.g. /dev/shm or $XDG_RUNTIME_DIR).
+    """
+    INDEX_FILE_NAME = "index.json"
+
+    def __init__(self, directory: str) -> None:
+        self.directory = directory
+        os.makedirs(self.directory, mode=0o700, exist_ok=True)
+        self._index_lock = threading.Lock()
+        self._index: Dict[str, Dict[str, str]] = self._load_index()
+
+    @staticmethod
+    def file_stem(authorize_url: Url) -> str:
+        return hashlib.sha256(authorize_url.canonical_string().encode("utf-8")).hexdigest()[:32]
+
+    def on_token_set(self, authorize_url: Url, token_data: dict) -> None:
+        stem = self.file_stem(authorize_url)
+        files = {"json": f"{stem}.json", "access_token": f"{stem}.access_token"}
+        self._write_atomic(files["json"], json.dumps(token_data))
+        self._write_atomic(files["access_token"], str(token_data.get("access_token", "")))
+
+        # tokens of different keys are written concurrently, the index is shared by all of them
+        key = authorize_url.canonical_string()
+        with self._index_lock:
+            if self._index.get(key) != files:
+                self._index[key] = files
+                self._write_atomic(self.INDEX_FILE_NAME, json.dumps(self._index, indent=2))
+
+    def on_token_removed(self, authorize_url: Url, token_data: dict) -> None:
+        stem = self.file_stem(authorize_url)
+        for name in (f"{stem}.json", f"{stem}.access_token"):
+            try:
+                os.unlink(os.path.join(self.directory, name))
+            except FileNotFoundError:
+                pass
+
+        with self._index_lock:
+            if self._index.pop(authorize_url.canonical_string(), None) is not None:
+                self._write_atomic(self.INDEX_FILE_NAME, json.dumps(self._index, indent=2))
+
+    def _load_index(self) -> Dict[str, Dict[str, str]]:
+        try:
+            with open(os.path.join(self.directory, self.INDEX_FILE_NAME)) as f:
+                index = json.load(f)
+            return index if isinstance(index, dict) else {}
+        except (OSError, ValueError):
+            return {}
+
+    def _write_atomic(self, name: str, content: str) -> None:
+        # mkstemp creates the file with 0600 permissions in the target directory, so rename is atomic
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, prefix=".tmp-")
+        try:
+            with os.fdopen(fd, "w") as f:
+                f.write(content)
+            os.replace(tmp_path, os.path.join(self.directory, name))
+        except BaseException:
+            try:
+                os.unlink(tmp_path)
+            except OSError:
+                pass
+            raise
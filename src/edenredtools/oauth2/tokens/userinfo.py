@@ -0,0 +1,108 @@
+from dataclasses import dataclass, field
+from datetime import datetime as dt
+import datetime
+import threading
+from typing import Any, Dict, Optional
+
+from edenredtools.net.url import Url
+from edenredtools.oauth2.identity_provider import IdentityProviderRegistry
+from edenredtools.oauth2.tokens.jwt import JwtValidationError, decode_unverified
+from edenredtools.oauth2.tokens.registry import Oauth2TokenRegistryListener
+from edenredtools.oauth2.tokens.validator import TokenValidator
+
+
+@dataclass
+class UserInfoEntry:
+    token_data: dict
+    claims: Optional[Dict[str, Any]]
+    expires_at: Optional[dt]
+    userinfo: Optional[Dict[str, Any]] = None
+    # None is also the userinfo of IdPs without userinfo endpoint, which is not looked up again
+    userinfo_fetched: bool = False
+    # serializes the userinfo fetches of the entry, concurrent misses make a single call
+    lock: threading.Lock = field(default_factory=threading.Lock, repr=False)
+
+
+class UserInfoCache(Oauth2TokenRegistryListener):
+    """
+    Identity of the user behind each token: the claims of its `id_token`, decoded once when the token is
+    set, and the response of the IdP userinfo endpoint, fetched on the first request only. Entries last
+    until the token of their authorize url is replaced, invalidated or expires.
+    The `id_token` signature is not verified: it was received directly from the token endpoint over TLS
+    (OpenID Connect Core 3.1.3.7), use `/proxy/validate` to verify tokens of unknown origin.
+    """
+
+    def __init__(self, identity_provider_registry: IdentityProviderRegistry) -> None:
+        self.identity_provider_registry = identity_provider_registry
+        self._lock = threading.Lock()
+        self._entries: Dict[Url, UserInfoEntry] = {}
+
+    def on_token_set(self, authorize_url: Url, token_data: dict) -> None:
+        entry = self._create_entry(token_data)
+        with self._lock:
+            self._entries[authorize_url] = entry
+            self._prune_expired()
+
+    def on_token_removed(self, authorize_url: Url, token_data: dict) -> None:
+        with self._lock:
+            entry = self._entries.get(authorize_url)
+            if entry and entry.token_data is token_data:
+                del self._entries[authorize_url]
+
+    def claims(self, authorize_url: Url, token_data: dict) -> Optional[Dict[str, Any]]:
+        """
+        Returns the claims of the `id_token` of `token_data`, None if it has none.
+        """
+        return self._entry(authorize_url, token_data).claims
+
+    def userinfo(self, authorize_url: Url, token_data: dict) -> Optional[Dict[str, Any]]:
+        """
+        Returns the userinfo of the user `token_data` was granted to, None if the IdP has no userinfo endpoint.
+        """
+        entry = self._entry(authorize_url, token_data)
+        with entry.lock:
+            if not entry.userinfo_fetched:
+                entry.userinfo = self._fetch_userinfo(authorize_url, token_data)
+                entry.userinfo_fetched = True
+            return entry.userinfo
+
+    def _entry(self, authorize_url: Url, token_data: dict) -> UserInfoEntry:
+        with self._lock:
+            entry = self._entries.get(authorize_url)
+            # a token reused from another authorize url (scope superset) or set before the cache listened
+            if not entry or entry.token_data is not token_data:
+                entry = self._entries[authorize_url] = self._create_entry(token_data)
+            return entry
+
+    @staticmethod
+    def _create_entry(token_data: dict) -> UserInfoEntry:
+        claims = None
+        if token_data.get("id_token"):
+            try:
+                _, claims, _, _ = decode_unverified(token_data["id_token"])
+            except JwtValidationError:
+                claims = None
+        return UserInfoEntry(token_data=token_data, claims=claims, expires_at=TokenValidator.expires_at(token_data))
+
+    def _prune_expired(self) -> None:
+        now = dt.now(datetime.timezone.utc)
+        expired = [url for url, entry in self._entries.items() if entry.expires_at and entry.expires_at <= now]
+        for authorize_url in expired:
+            del self._entries[authorize_url]
+
+    def _fetch_userinfo(self, authorize_url: Url, token_data: dict) -> Optional[Dict[str, Any]]:
+        identity_provider = self.identity_provider_registry.get_or_create(authorize_url.base_url())
+        userinfo_url = identity_provider.userinfo_url()
+        if not userinfo_url:
+            return None
+
+        response = identity_provider.http_client().get(
+            str(userinfo_url),
+            headers={"Authorization": f"Bearer {token_data['access_token']}", "Accept": "application/json"}
+        )
+        response.raise_for_status()
+        # signed userinfo responses (application/jwt) come from the same TLS connection as JSON ones
+        if response.headers.get("Content-Type", "").startswith("application/jwt"):
+            _, userinfo, _, _ = decode_unverified(response.text.strip())
+            return userinfo
+        return response.json()
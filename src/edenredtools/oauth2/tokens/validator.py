@@ -1,32 +1,44 @@
 from datetime import datetime as dt, timedelta
 import datetime
+from typing import Optional
 
 
 class TokenValidator:
     @staticmethod
-    def is_valid(token_data: dict, buffer_seconds) -> bool:
+    def expires_at(token_data: dict) -> Optional[dt]:
         """
-        Returns True if token is still valid for at least `buffer_seconds`.
+        Returns the (timezone aware) expiration time of the token, or None if it cannot be determined.
         """
-        
-        def expired(expiration: dt) -> bool:
-            return dt.now(datetime.timezone.utc) + timedelta(seconds=buffer_seconds) < expiration
-        
-        if "access_token" not in token_data:
-            return False
-
+        expiration = None
         if "expires_at" in token_data:
             try:
-                return expired(dt.fromisoformat(token_data["expires_at"]))
-            except ValueError:
-                return False
+                expiration = dt.fromisoformat(token_data["expires_at"])
+            except (ValueError, TypeError):
+                return None
 
-        if "expires_in" in token_data and "issued_at" in token_data:
+        elif "expires_in" in token_data and "issued_at" in token_data:
             try:
                 issued_at = dt.fromisoformat(token_data["issued_at"])
                 expires_in = int(token_data["expires_in"])
-                return expired(issued_at + timedelta(seconds=expires_in))
+                expiration = issued_at + timedelta(seconds=expires_in)
             except (ValueError, TypeError):
-                return False
+                return None
+
+        # naive datetimes cannot be compared to the current time, such tokens are invalid
+        if expiration and expiration.tzinfo is None:
+            return None
+        return expiration
+
+    @staticmethod
+    def is_valid(token_data: dict, buffer_seconds) -> bool:
+        """
+        Returns True if token is still valid for at least `buffer_seconds`.
+        """
+        if "access_token" not in token_data:
+            return False
+
+        expiration = TokenValidator.expires_at(token_data)
+        if not expiration:
+            return False
 
-        return False
\ No newline at end of file
+        return dt.now(datetime.timezone.utc) + timedelta(seconds=buffer_seconds) < expiration
@@ -1,4 +1,6 @@
 import subprocess
+import threading
+import time
 import webbrowser
 from edenredtools.system.platform import Platform
 
@@ -8,4 +10,55 @@ class Browser:
         if Platform.is_wsl():
             subprocess.run(["cmd.exe", "/c", "start", "", url.replace("&", "^&")])
         else:
-            webbrowser.open(url)
\ No newline at end of file
+            webbrowser.open(url)
+
+
+class CoalescingBrowserLauncher:
+    """
+    Opens the same `url` in the browser on behalf of many concurrent requesters.
+    Requests received within `coalesce_window` seconds result in a single launch, launches are
+    at most one every `min_interval` seconds and are skipped while the page reports itself as open.
+    """
+
+    def __init__(
+        self,
+        browser: Browser,
+        url: str,
+        min_interval: float = 10.0,
+        coalesce_window: float = 0.5,
+        seen_ttl: float = 6.0
+    ) -> None:
+        self.browser = browser
+        self.url = url
+        self.min_interval = min_interval
+        self.coalesce_window = coalesce_window
+        self.seen_ttl = seen_ttl
+        self._lock = threading.Lock()
+        self._scheduled = False
+        self._last_launch = float("-inf")
+        self._last_seen = float("-inf")
+
+    def notify_seen(self) -> None:
+        with self._lock:
+            self._last_seen = time.monotonic()
+
+    def request_launch(self) -> None:
+        with self._lock:
+            if self._scheduled:
+                return
+            self._scheduled = True
+            delay = max(self.coalesce_window, self._last_launch + self.min_interval - time.monotonic())
+
+        timer = threading.Timer(delay, self._launch)
+        timer.daemon = True
+        timer.start()
+
+    def _launch(self) -> None:
+        with self._lock:
+            self._scheduled = False
+            now = time.monotonic()
+            if now - self._last_seen < self.seen_ttl:
+                # the page is open and refreshing, it will list the new requests by itself
+                return
+            self._last_launch = now
+        self.browser.open(self.url)
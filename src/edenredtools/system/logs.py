@@ -0,0 +1,89 @@
+from datetime import datetime as dt
+import datetime
+import json
+import logging
+import logging.handlers
+import queue
+import random
+import sys
+from typing import Any, Dict, Optional, TextIO
+
+ROOT_LOGGER_NAME = "edenredtools"
+
+
+def log_event(logger: logging.Logger, event: str, level: int = logging.INFO, **fields: Any) -> None:
+    """
+    Emits a structured event: `event` is its name, `fields` its attributes (serialized as JSON, using
+    `str` for anything not natively serializable, so cheap objects can be passed as they are).
+    """
+    if logger.isEnabledFor(level):
+        logger.log(level, event, extra={"event": event, "fields": fields})
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        entry: Dict[str, Any] = {
+            "ts": dt.fromtimestamp(record.created, datetime.timezone.utc).isoformat(),
+            "level": record.levelname.lower(),
+            "logger": record.name,
+            "event": getattr(record, "event", None) or record.getMessage(),
+        }
+        entry.update(getattr(record, "fields", {}))
+        if getattr(record, "sample_rate", None) is not None:
+            entry["sample_rate"] = record.sample_rate
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+class EventSampler(logging.Filter):
+    """
+    Keeps only a fraction of the records of high rate events, e.g. {"token.cache_hit": 0.01}.
+    Kept records carry their `sample_rate`, so that counts can be extrapolated.
+    """
+
+    def __init__(self, rates: Optional[Dict[str, float]] = None) -> None:
+        super().__init__()
+        self.rates = dict(rates or {})
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        rate = self.rates.get(getattr(record, "event", None))
+        if rate is None:
+            return True
+        record.sample_rate = rate
+        return random.random() < rate
+
+
+class _EnqueueOnlyHandler(logging.handlers.QueueHandler):
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # formatting is left to the listener thread, the caller only pays for the enqueue
+        return record
+
+
+def configure_logging(
+    level: int = logging.INFO,
+    sample_rates: Optional[Dict[str, float]] = None,
+    stream: TextIO = sys.stderr
+) -> logging.handlers.QueueListener:
+    """
+    Routes the edenredtools and werkzeug loggers to a queue drained by a background thread that writes
+    JSON lines to `stream`, so that logging I/O never happens on request threads.
+    Returns the started listener, stop it to flush the pending records.
+    """
+    records: "queue.SimpleQueue[logging.LogRecord]" = queue.SimpleQueue()
+    queue_handler = _EnqueueOnlyHandler(records)
+    queue_handler.addFilter(EventSampler(sample_rates))
+
+    stream_handler = logging.StreamHandler(stream)
+    stream_handler.setFormatter(JsonFormatter())
+
+    for name, logger_level in ((ROOT_LOGGER_NAME, level), ("werkzeug", max(level, logging.WARNING))):
+        # werkzeug access lines are superseded by the structured events of the proxy
+        logger = logging.getLogger(name)
+        logger.handlers = [queue_handler]
+        logger.setLevel(logger_level)
+        logger.propagate = False
+
+    listener = logging.handlers.QueueListener(records, stream_handler, respect_handler_level=True)
+    listener.start()
+    return listener
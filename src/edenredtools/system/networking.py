@@ -1,7 +1,12 @@
 from abc import abstractmethod
+import logging
 import re
 import subprocess
 
+from edenredtools.system.logs import log_event
+
+logger = logging.getLogger(__name__)
+
 
 class LocalNetworking:    
     @abstractmethod 
@@ -36,16 +41,20 @@ class LocalNetworking:
         dst_address: str="127.0.0.1"
     ) -> None:
         if self.check_enabled_ip_forwarding():
-            print("IP port forwarding already enabled")
+            log_event(logger, "networking.ip_forwarding_enabled", already=True)
         else:
-            print("Enabling IP port forwarding")
+            log_event(logger, "networking.ip_forwarding_enabled", already=False)
             self.enable_ip_forwarding()
         
         if self.check_ip_forwarding_exists(src_port, dst_port, src_address, dst_address):
-            print(f"Rule already exists: {src_port} → {dst_port}")
+            log_event(
+                logger, "networking.forwarding_rule_added", src_port=src_port, dst_port=dst_port, already=True
+            )
             return
         
-        print(f"Adding rule: {src_port} → {dst_port}")
+        log_event(
+            logger, "networking.forwarding_rule_added", src_port=src_port, dst_port=dst_port, already=False
+        )
         self.add_ip_forwarding_rule(src_port, dst_port, src_address, dst_address)
 
         
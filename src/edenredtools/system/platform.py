@@ -1,5 +1,5 @@
 import platform
-from typing import TypeVar
+from typing import Optional, TypeVar
 
 
 T = TypeVar('T')
@@ -7,19 +7,26 @@ T = TypeVar('T')
 
 class Platform:
     SUPPORTED_PLATFORMS = ["windows", "linux"]
-    _PLATFORM = platform.system().lower()
-    if _PLATFORM not in SUPPORTED_PLATFORMS:
-        raise SystemError(f"platform '{_PLATFORM}' is not supported. Supported: {SUPPORTED_PLATFORMS}")
+    _PLATFORM: Optional[str] = None
+    _IS_WSL: Optional[bool] = None
 
     @classmethod
     def get_platform(cls) -> str:
+        # detected on first use rather than at import time to keep CLI startup cheap
+        if cls._PLATFORM is None:
+            system = platform.system().lower()
+            if system not in cls.SUPPORTED_PLATFORMS:
+                raise SystemError(f"platform '{system}' is not supported. Supported: {cls.SUPPORTED_PLATFORMS}")
+            cls._PLATFORM = system
         return cls._PLATFORM
     
     @classmethod
     def is_wsl(cls) -> bool:
-        try:
-            with open("/proc/sys/kernel/osrelease") as f:
-                osrelease = f.read().lower()
-            return "microsoft" in osrelease and "wsl2" in osrelease
-        except FileNotFoundError:
-            return False
\ No newline at end of file
+        if cls._IS_WSL is None:
+            try:
+                with open("/proc/sys/kernel/osrelease") as f:
+                    osrelease = f.read().lower()
+                cls._IS_WSL = "microsoft" in osrelease and "wsl2" in osrelease
+            except FileNotFoundError:
+                cls._IS_WSL = False
+        return cls._IS_WSL
\ No newline at end of file
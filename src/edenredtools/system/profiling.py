@@ -0,0 +1,92 @@
+from collections import Counter
+import os
+import sys
+import threading
+import time
+import tracemalloc
+from types import FrameType
+from typing import Dict, List, Optional
+
+
+class ProfilerBusy(Exception):
+    pass
+
+
+class SamplingProfiler:
+    """
+    Statistical profiler of every thread of the process: the stacks of all threads are sampled
+    every `interval` seconds through `sys._current_frames`, so it attaches to request and flow
+    threads that are already running, with no tracing overhead outside of a capture.
+    Only one capture (CPU or heap) runs at a time.
+    """
+
+    def __init__(self, interval: float = 0.005) -> None:
+        self.interval = interval
+        self._busy = threading.Lock()
+
+    def capture(self, seconds: float) -> Dict[str, int]:
+        """
+        Returns the collapsed stacks (`thread;outer;...;inner` -> samples) observed during `seconds`.
+        """
+        if not self._busy.acquire(blocking=False):
+            raise ProfilerBusy("A profile capture is already running.")
+        try:
+            stacks: Dict[str, int] = Counter()
+            own_ident = threading.get_ident()
+            deadline = time.monotonic() + seconds
+            while time.monotonic() < deadline:
+                names = {thread.ident: thread.name for thread in threading.enumerate()}
+                for ident, frame in sys._current_frames().items():
+                    if ident != own_ident:
+                        stacks[self._collapse(names.get(ident, str(ident)), frame)] += 1
+                time.sleep(self.interval)
+            return stacks
+        finally:
+            self._busy.release()
+
+    def capture_heap(self, seconds: float, limit: int = 50, frames: int = 1) -> List[str]:
+        """
+        Returns the `limit` source lines whose allocated memory grew the most during `seconds`
+        (tracemalloc snapshot diff). Tracing is only enabled for the duration of the capture.
+        """
+        if not self._busy.acquire(blocking=False):
+            raise ProfilerBusy("A profile capture is already running.")
+        started = not tracemalloc.is_tracing()
+        try:
+            if started:
+                tracemalloc.start(frames)
+            before = tracemalloc.take_snapshot()
+            time.sleep(seconds)
+            after = tracemalloc.take_snapshot()
+            traced, peak = tracemalloc.get_traced_memory()
+        finally:
+            if started:
+                tracemalloc.stop()
+            self._busy.release()
+
+        own_traces = (tracemalloc.Filter(False, tracemalloc.__file__),)
+        before, after = before.filter_traces(own_traces), after.filter_traces(own_traces)
+        key_type = "traceback" if frames > 1 else "lineno"
+        lines = [f"# traced {traced} B, peak {peak} B, top {limit} allocation growths over {seconds:g}s"]
+        for stat in after.compare_to(before, key_type)[:limit]:
+            lines.append(str(stat))
+            if frames > 1:
+                lines.extend(f"    {line}" for line in stat.traceback.format())
+        return lines
+
+    @staticmethod
+    def format_collapsed(stacks: Dict[str, int]) -> str:
+        """
+        Formats stacks as consumed by flamegraph.pl, speedscope or inferno.
+        """
+        return "".join(f"{stack} {count}\n" for stack, count in sorted(stacks.items()))
+
+    @staticmethod
+    def _collapse(thread_name: str, frame: Optional[FrameType]) -> str:
+        functions = []
+        while frame is not None:
+            code = frame.f_code
+            functions.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+            frame = frame.f_back
+        functions.append(thread_name.replace(";", ":"))
+        return ";".join(reversed(functions))
@@ -0,0 +1,38 @@
+import os
+import socket
+from typing import List
+
+
+class SystemdSockets:
+    SD_LISTEN_FDS_START = 3
+
+    @classmethod
+    def listen_fds(cls, unset_environment: bool = True) -> List[int]:
+        """
+        Returns the listening socket file descriptors passed by systemd socket activation,
+        following the `sd_listen_fds` protocol (LISTEN_PID / LISTEN_FDS).
+        """
+        try:
+            if int(os.environ.get("LISTEN_PID", "0")) != os.getpid():
+                return []
+            count = int(os.environ.get("LISTEN_FDS", "0"))
+        except ValueError:
+            return []
+        finally:
+            if unset_environment:
+                # do not leak inherited sockets info to spawned processes (e.g. the browser)
+                for name in ("LISTEN_PID", "LISTEN_FDS", "LISTEN_FDNAMES"):
+                    os.environ.pop(name, None)
+
+        return list(range(cls.SD_LISTEN_FDS_START, cls.SD_LISTEN_FDS_START + count))
+
+    @staticmethod
+    def bind_host(fd: int) -> str:
+        """
+        Returns the address the inherited socket is bound to, without taking ownership of the descriptor.
+        """
+        sock = socket.socket(fileno=fd)
+        try:
+            return sock.getsockname()[0]
+        finally:
+            sock.detach()